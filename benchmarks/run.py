@@ -0,0 +1,315 @@
+"""Headless benchmarks for space_view3d_3d_pins.py.
+
+Runs the addon against the stand-ins in stubs.py and prints one JSON
+document with timings and GL call counts per scenario:
+
+    python benchmarks/run.py [--quick] [--output FILE] [--addon PATH]
+
+Pins are seeded through the legacy pickle file every revision can load, so
+results from different revisions of the addon can be compared directly.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import shutil
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON = os.path.join(ROOT, 'space_view3d_3d_pins.py')
+
+WIDTH = 1280
+HEIGHT = 720
+
+
+class Session(object):
+    """One registered copy of the addon with the pins overlay running."""
+
+    def __init__(self, addon, pins=(), presets=(), extra_menus=0, extra_types=0):
+        self.bpy = stubs.install(extra_menus=extra_menus, extra_types=extra_types)
+        self.tempdir = self.bpy.app.tempdir
+        self.context = self.bpy.context
+        self.wm = self.context.window_manager
+        with quiet():
+            self.module = stubs.load_addon(addon)
+        if pins or presets:
+            data = {
+                'version': self.module.bl_info['version'],
+                'pins_enabled': False,
+                'pins_opacity': 0.65,
+                'pins_presets_active_index': 0,
+                'pins': list(pins),
+                'presets': list(presets),
+            }
+            with open(self.tempdir + 'blender_pins.dat', 'wb') as f:
+                pickle.dump(data, f, protocol=2)
+        with quiet():
+            self.module.register()
+            self.bpy.ops.view3d.pins('INVOKE_DEFAULT')
+        self.op = self.wm.modal_handlers[-1]
+        self.draw = [h for h in stubs.SpaceView3D._handlers if h[0].__name__ == 'draw_callback_px'][-1]
+
+    def frame(self):
+        self.draw[0](*self.draw[1])
+
+    def event(self, type, value='NOTHING', x=0, y=0):
+        return self.op.modal(self.context, stubs.Event(type, value, x, y))
+
+    def close(self):
+        with quiet():
+            self.module.unregister()
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def make_pins(rng, count, presets, chain=0):
+    """Set pins spread across ``presets``; every ``chain`` pins form a parent chain."""
+    pins = []
+    for i in range(count):
+        pin = {
+            'id': 'pin%i' % i,
+            'preset': 'preset%i' % (i % presets),
+            'text': 'Pin %i' % i,
+            'mode': 'OBJECT',
+            'type': i % 2,
+            'call': 'INFO_MT_mesh_add' if i % 2 == 0 else 'bpy.ops.mesh.primitive_cube_add()',
+            'x': rng.uniform(0.05, 0.95),
+            'y': rng.uniform(0.05, 0.95),
+            'set': True,
+            'parent': '0',
+            'align': 0,
+        }
+        if chain and i % chain and i >= presets:
+            pin['parent'] = 'pin%i' % (i - presets)
+            pin['align'] = rng.randint(0, 3)
+        pins.append(pin)
+    return pins
+
+
+def make_presets(count):
+    return [{'name': 'Preset %i' % i, 'id': 'preset%i' % i} for i in range(count)]
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        samples.append(perf_counter() - start)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0] * 1000, 4),
+        'median_ms': round(samples[len(samples) // 2] * 1000, 4),
+    }
+
+
+def bench_draw(addon, rng, counts, presets_list, repeat, chain=0):
+    results = []
+    for count in counts:
+        for presets in presets_list:
+            if presets > count:
+                continue
+            session = Session(addon, make_pins(rng, count, presets, chain), make_presets(presets))
+            session.event('MOUSEMOVE', x=WIDTH // 2, y=HEIGHT // 2)
+            session.frame()
+            stubs.gl_log.clear()
+            stubs.rna_log.clear()
+            session.frame()
+            calls = stubs.gl_log.count()
+            writes = stubs.rna_log.count('set')
+            begins = stubs.gl_log.count('glBegin')
+            stubs.gl_log.enabled = stubs.rna_log.enabled = False
+            timing = measure(session.frame, repeat)
+            stubs.gl_log.enabled = stubs.rna_log.enabled = True
+            session.close()
+            result = {'pins': count, 'presets': presets, 'gl_calls': calls, 'gl_begins': begins, 'rna_writes': writes}
+            result.update(timing)
+            results.append(result)
+    return results
+
+
+def bench_drag(addon, rng, counts, repeat):
+    results = []
+    for count in counts:
+        pins = make_pins(rng, count, 1)
+        pins[-1]['set'] = False
+        session = Session(addon, pins, make_presets(1))
+        path = [(rng.randint(0, WIDTH), rng.randint(0, HEIGHT)) for _ in range(64)]
+        state = {'step': 0}
+
+        def step():
+            x, y = path[state['step'] % len(path)]
+            state['step'] += 1
+            session.event('MOUSEMOVE', x=x, y=y)
+            session.frame()
+
+        stubs.gl_log.enabled = False
+        timing = measure(step, repeat)
+        stubs.gl_log.enabled = True
+        session.close()
+        result = {'pins': count}
+        result.update(timing)
+        results.append(result)
+    return results
+
+
+def bench_roundtrip(addon, rng, counts, repeat):
+    results = []
+    for count in counts:
+        session = Session(addon, make_pins(rng, count, 10), make_presets(10))
+        module = session.module
+        wm = session.wm
+
+        def save():
+            with quiet():
+                module.save_pins(session.context)
+                journal = getattr(module, '_pins_journal', None)
+                if journal is not None:
+                    journal.flush(session.context)
+
+        def load():
+            wm.pins_data.clear()
+            wm.pins_presets.clear()
+            with quiet():
+                module.load_pins(session.context)
+
+        save_timing = measure(save, repeat)
+        load_timing = measure(load, repeat)
+        size = os.path.getsize(session.tempdir + 'blender_pins.dat')
+        session.close()
+        results.append({
+            'pins': count,
+            'file_bytes': size,
+            'save_median_ms': save_timing['median_ms'],
+            'load_median_ms': load_timing['median_ms'],
+        })
+    return results
+
+
+def bench_presets(addon, rng, counts, presets, repeat):
+    results = []
+    for count in counts:
+        session = Session(addon, make_pins(rng, count, presets), make_presets(presets))
+        wm = session.wm
+        state = {'step': 0}
+
+        def switch():
+            state['step'] += 1
+            wm.pins_presets_active_index = state['step'] % presets
+            session.frame()
+
+        def remove():
+            with quiet():
+                session.bpy.ops.view3d.pins_preset_remove()
+
+        result = {'pins': count, 'presets': presets}
+        result['switch_median_ms'] = measure(switch, repeat)['median_ms']
+        result['remove_median_ms'] = measure(remove, min(repeat, presets - 1))['median_ms']
+        session.close()
+        results.append(result)
+    return results
+
+
+def bench_capture(addon, repeat):
+    session = Session(addon, (), make_presets(1))
+    session.wm.operators.append(stubs.OperatorHistoryItem(
+        'MESH_OT_primitive_cube_add', 'Add Cube',
+        radius=1.0, view_align=False, location=(0.0, 1.0, 2.0)))
+
+    def capture():
+        with quiet():
+            session.bpy.ops.view3d.pins_add_operator(text='Cube', last_op_id=0, with_pars=True)
+
+    timing = measure(capture, repeat)
+    pins = len(session.wm.pins_data)
+    session.close()
+    result = {'pins_added': pins}
+    result.update(timing)
+    return result
+
+
+def bench_register(addon, repeat):
+    tempdir = stubs.install().app.tempdir
+
+    def cycle():
+        stubs.install(tempdir=tempdir, extra_menus=200, extra_types=4000)
+        with quiet():
+            module = stubs.load_addon(addon)
+            start = perf_counter()
+            module.register()
+            state['register'].append(perf_counter() - start)
+            module.unregister()
+        state['scans'] = stubs._TypesModule.scans
+
+    state = {'register': [], 'scans': 0}
+    timing = measure(cycle, repeat)
+    shutil.rmtree(tempdir, ignore_errors=True)
+    return {
+        'cycle_median_ms': timing['median_ms'],
+        'register_min_ms': round(min(state['register']) * 1000, 4),
+        'types_dir_scans': state['scans'],
+    }
+
+
+def revision(addon):
+    try:
+        return subprocess.check_output(
+            ['git', 'log', '-1', '--format=%H', '--', os.path.basename(addon)],
+            cwd=os.path.dirname(os.path.abspath(addon)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes and fewer repeats")
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--addon', default=ADDON, help="Path of the addon file to benchmark")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        counts, presets, repeat = (10, 100, 1000), (1, 10), 5
+    else:
+        counts, presets, repeat = (10, 100, 1000, 10000), (1, 10, 50), 20
+
+    rng = random.Random(1)
+    results = {
+        'addon': os.path.basename(args.addon),
+        'revision': revision(args.addon),
+        'python': platform.python_version(),
+        'quick': args.quick,
+        'scenarios': {
+            'draw': bench_draw(args.addon, rng, counts, presets, repeat),
+            'draw_chains': bench_draw(args.addon, rng, counts[:-1], (1,), repeat, chain=50),
+            'drag_snap': bench_drag(args.addon, rng, counts[:-1], repeat * 4),
+            'presets': bench_presets(args.addon, rng, counts, 10, repeat),
+            'roundtrip': bench_roundtrip(args.addon, rng, counts, max(3, repeat // 4)),
+            'capture': bench_capture(args.addon, repeat * 10),
+            'register': bench_register(args.addon, repeat),
+        },
+    }
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,690 @@
+"""Headless stand-ins for Blender's bpy, bgl and blf modules.
+
+Only the surface used by space_view3d_3d_pins.py is provided.  GL and font
+calls are recorded instead of drawn so scenarios can count submissions.
+"""
+
+import sys
+import tempfile
+import types
+
+
+class CallLog(object):
+    def __init__(self):
+        self.calls = []
+        self.enabled = True
+
+    def __call__(self, name, *args):
+        if self.enabled:
+            self.calls.append((name, args))
+
+    def count(self, name=None):
+        if name is None:
+            return len(self.calls)
+        return sum(1 for c in self.calls if c[0] == name)
+
+    def clear(self):
+        del self.calls[:]
+
+
+gl_log = CallLog()
+rna_log = CallLog()
+
+
+# ---------------------------------------------------------------- bpy.props
+
+class _Prop(object):
+    def __init__(self, kind, args, kw):
+        self.kind = kind
+        self.name = None
+        self.kw = kw
+        if args and 'name' not in kw and isinstance(args[0], str):
+            kw = dict(kw, name=args[0])
+            self.kw = kw
+        self.default = kw.get('default', _DEFAULTS.get(kind))
+        self.type = kw.get('type')
+        self.update = kw.get('update')
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        d = obj.__dict__.setdefault('_props', {})
+        if self.name not in d:
+            if self.kind == 'collection':
+                d[self.name] = Collection(self.type)
+            elif self.kind == 'pointer':
+                d[self.name] = self.type()
+            else:
+                return self.default
+        return d[self.name]
+
+    def __set__(self, obj, value):
+        rna_log('set', self.name)
+        if self.kind == 'float':
+            value = float(value)
+            if 'min' in self.kw:
+                value = max(self.kw['min'], value)
+            if 'max' in self.kw:
+                value = min(self.kw['max'], value)
+        elif self.kind == 'int':
+            value = int(value)
+        elif self.kind == 'bool':
+            value = bool(value)
+        elif self.kind == 'string':
+            value = str(value)
+        obj.__dict__.setdefault('_props', {})[self.name] = value
+        if self.update is not None:
+            self.update(obj, sys.modules['bpy'].context)
+
+
+_DEFAULTS = {'string': '', 'int': 0, 'float': 0.0, 'bool': False}
+
+
+def _prop_factory(kind):
+    def factory(*args, **kw):
+        return _Prop(kind, args, kw)
+    factory.__name__ = kind.capitalize() + 'Property'
+    return factory
+
+
+StringProperty = _prop_factory('string')
+IntProperty = _prop_factory('int')
+FloatProperty = _prop_factory('float')
+BoolProperty = _prop_factory('bool')
+EnumProperty = _prop_factory('enum')
+CollectionProperty = _prop_factory('collection')
+PointerProperty = _prop_factory('pointer')
+FloatVectorProperty = _prop_factory('floatvector')
+IntVectorProperty = _prop_factory('intvector')
+
+
+class Collection(object):
+    def __init__(self, item_type):
+        self._type = item_type
+        self._items = []
+
+    def add(self):
+        rna_log('add')
+        item = self._type()
+        self._items.append(item)
+        return item
+
+    def remove(self, index):
+        rna_log('remove')
+        del self._items[index]
+
+    def clear(self):
+        rna_log('clear')
+        del self._items[:]
+
+    def foreach_get(self, attr, seq):
+        rna_log('foreach_get', attr)
+        for i, item in enumerate(self._items):
+            seq[i] = getattr(item, attr)
+
+    def foreach_set(self, attr, seq):
+        rna_log('foreach_set', attr)
+        prop = getattr(self._type, attr)
+        for i, item in enumerate(self._items):
+            item.__dict__.setdefault('_props', {})[attr] = type(prop.default)(seq[i])
+
+    def move(self, a, b):
+        self._items.insert(b, self._items.pop(a))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def values(self):
+        return list(self._items)
+
+
+# ---------------------------------------------------------------- bpy.types
+
+class _StructMeta(type):
+    def __setattr__(cls, key, value):
+        if isinstance(value, _Prop):
+            value.name = key
+        super(_StructMeta, cls).__setattr__(key, value)
+
+    def __delattr__(cls, key):
+        super(_StructMeta, cls).__delattr__(key)
+
+
+class bpy_struct(object, metaclass=_StructMeta):
+    def keys(self):
+        return list(self.__dict__.get('_props', {}).keys())
+
+    def __contains__(self, key):
+        return key in self.__dict__.get('_props', {})
+
+    def __delitem__(self, key):
+        del self.__dict__['_props'][key]
+
+    def get(self, key, default=None):
+        return self.__dict__.get('_props', {}).get(key, default)
+
+
+class PropertyGroup(bpy_struct):
+    pass
+
+
+class Operator(bpy_struct):
+    bl_idname = ''
+    bl_label = ''
+    bl_options = set()
+
+    def __init__(self):
+        self.reports = []
+
+    def report(self, kind, message):
+        self.reports.append((kind, message))
+
+    @property
+    def properties(self):
+        return self
+
+
+class AddonPreferences(bpy_struct):
+    bl_idname = ''
+
+
+class Panel(bpy_struct):
+    def __init__(self):
+        self.layout = Layout()
+
+
+class UIList(bpy_struct):
+    layout_type = 'DEFAULT'
+    filter_name = ''
+    use_filter_sort_alpha = False
+    use_filter_sort_reverse = False
+    bitflag_filter_item = 1 << 30
+
+
+class UI_UL_list(UIList):
+    @staticmethod
+    def filter_items_by_name(pattern, bitflag, items, propname="name",
+                             flags=None, reverse=False):
+        import fnmatch
+        if not pattern or not items:
+            return []
+        if flags is None:
+            flags = [0] * len(items)
+        pattern = pattern if '*' in pattern else '*%s*' % pattern
+        for i, item in enumerate(items):
+            name = getattr(item, propname, None)
+            if name is not None and fnmatch.fnmatch(name.lower(), pattern.lower()) != reverse:
+                flags[i] |= bitflag
+        return flags
+
+    @staticmethod
+    def sort_items_by_name(items, propname="name"):
+        order = sorted(range(len(items)), key=lambda i: getattr(items[i], propname, '').lower())
+        neworder = [0] * len(items)
+        for new, old in enumerate(order):
+            neworder[old] = new
+        return neworder
+
+
+class Menu(bpy_struct):
+    _draw_funcs = None
+
+    @classmethod
+    def append(cls, func):
+        if cls.__dict__.get('_draw_funcs') is None:
+            cls._draw_funcs = []
+        cls._draw_funcs.append(func)
+
+    @classmethod
+    def prepend(cls, func):
+        cls.append(func)
+
+    @classmethod
+    def remove(cls, func):
+        funcs = cls.__dict__.get('_draw_funcs') or []
+        if func in funcs:
+            funcs.remove(func)
+
+    def draw(self, context):
+        pass
+
+
+class Layout(object):
+    def __init__(self):
+        self.enabled = True
+        self.alignment = 'EXPAND'
+        self.count = 0
+
+    def _ui(self, *args, **kw):
+        self.count += 1
+        return _AnyProps()
+
+    prop = label = separator = template_list = _ui
+
+    def operator(self, *args, **kw):
+        self.count += 1
+        return _AnyProps()
+
+    def row(self, *args, **kw):
+        self.count += 1
+        return self
+
+    column = box = split = row
+
+
+class _AnyProps(object):
+    pass
+
+
+class SpaceView3D(bpy_struct):
+    _handlers = []
+
+    @classmethod
+    def draw_handler_add(cls, func, args, region, stage):
+        handle = (func, args, region, stage)
+        cls._handlers.append(handle)
+        return handle
+
+    @classmethod
+    def draw_handler_remove(cls, handle, region):
+        if handle in cls._handlers:
+            cls._handlers.remove(handle)
+
+
+class OperatorHistoryItem(bpy_struct):
+    def __init__(self, idname='MESH_OT_primitive_cube_add', label='Add Cube', **props):
+        self.bl_idname = idname
+        self.name = label
+        self.properties = OperatorProperties(props)
+
+
+class RNAProperty(object):
+    def __init__(self, identifier, type, is_enum_flag=False):
+        self.identifier = identifier
+        self.type = type
+        self.is_enum_flag = is_enum_flag
+
+
+class RNAStruct(object):
+    def __init__(self, values):
+        self.properties = {'rna_type': RNAProperty('rna_type', 'POINTER')}
+        for k, v in values.items():
+            if isinstance(v, bool):
+                kind = 'BOOLEAN'
+            elif isinstance(v, int):
+                kind = 'INT'
+            elif isinstance(v, float):
+                kind = 'FLOAT'
+            elif isinstance(v, str):
+                kind = 'STRING'
+            elif isinstance(v, set):
+                kind = 'ENUM'
+            elif isinstance(v, OperatorProperties):
+                kind = 'POINTER'
+            else:
+                kind = 'FLOAT'
+            self.properties[k] = RNAProperty(k, kind, isinstance(v, set))
+        rna_log('bl_rna')
+
+
+class OperatorProperties(object):
+    """Operator properties; nested dict values become pointer groups."""
+
+    def __init__(self, props):
+        for k, v in props.items():
+            setattr(self, k, OperatorProperties(v) if isinstance(v, dict) else v)
+        self._keys = list(props)
+        self._values = dict((k, getattr(self, k)) for k in props)
+
+    @property
+    def bl_rna(self):
+        return RNAStruct(self._values)
+
+    def keys(self):
+        return list(self._keys)
+
+
+class Timer(object):
+    def __init__(self, step):
+        self.time_step = step
+
+
+class WindowManager(bpy_struct):
+    def __init__(self):
+        self.operators = []
+        self.modal_handlers = []
+        self.timers = []
+
+    def modal_handler_add(self, op):
+        self.modal_handlers.append(op)
+        return True
+
+    def event_timer_add(self, step, window=None):
+        timer = Timer(step)
+        self.timers.append(timer)
+        return timer
+
+    def event_timer_remove(self, timer):
+        if timer in self.timers:
+            self.timers.remove(timer)
+
+    def fileselect_add(self, op):
+        pass
+
+
+class Theme(object):
+    def __init__(self):
+        ui = types.SimpleNamespace()
+        ui.wcol_menu_item = types.SimpleNamespace(inner_sel=(0.34, 0.5, 0.76, 1.0))
+        ui.wcol_menu = types.SimpleNamespace(inner_sel=(0.27, 0.27, 0.27, 1.0))
+        self.user_interface = ui
+
+
+class UserPreferences(object):
+    def __init__(self):
+        self.themes = [Theme()]
+        self.addons = {}
+
+
+class Area(object):
+    def __init__(self):
+        self.type = 'VIEW_3D'
+        self.redraws = 0
+        self.header_text = None
+
+    def tag_redraw(self):
+        self.redraws += 1
+
+    def header_text_set(self, text=None):
+        self.header_text = text
+
+
+class Region(object):
+    def __init__(self, width=1280, height=720):
+        self.id = 1
+        self.width = width
+        self.height = height
+
+
+class Context(object):
+    def __init__(self):
+        self.window_manager = WindowManager()
+        self.area = Area()
+        self.region = Region()
+        self.window = object()
+        self.mode = 'OBJECT'
+        self.user_preferences = UserPreferences()
+
+
+class Event(object):
+    def __init__(self, type='MOUSEMOVE', value='NOTHING', x=0, y=0):
+        self.type = type
+        self.value = value
+        self.mouse_region_x = x
+        self.mouse_region_y = y
+
+
+# ---------------------------------------------------------------- bpy.ops
+
+class _OpCall(object):
+    def __init__(self, registry, path):
+        self._registry = registry
+        self._path = path
+
+    def __getattr__(self, name):
+        return _OpCall(self._registry, self._path + [name])
+
+    def idname(self):
+        return '%s_OT_%s' % (self._path[0].upper(), self._path[1])
+
+    def get_rna(self):
+        return self._registry.classes.get('.'.join(self._path))
+
+    def __call__(self, *args, **kw):
+        bpy = sys.modules['bpy']
+        key = '.'.join(self._path)
+        self._registry.log.append((key, args, kw))
+        cls = self._registry.classes.get(key)
+        if cls is None:
+            if key in self._registry.failing:
+                raise RuntimeError("Operator %s failed" % key)
+            return {'FINISHED'}
+        op = cls()
+        for k, v in kw.items():
+            setattr(op, k, v)
+        ctx = bpy.context
+        if args and args[0] == 'INVOKE_DEFAULT' and hasattr(op, 'invoke'):
+            return op.invoke(ctx, Event())
+        return op.execute(ctx)
+
+
+class _Ops(object):
+    """bpy.ops stand-in.
+
+    Registered addon operators are executed; any other operator call is
+    logged and returns {'FINISHED'}, or raises if listed in ``failing``.
+    """
+
+    def __init__(self):
+        self.classes = {}
+        self.log = []
+        self.failing = set()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _OpCall(self, [name])
+
+
+# ---------------------------------------------------------------- install
+
+class _TypesModule(types.ModuleType):
+    """bpy.types stand-in that counts attribute lookups and dir() scans."""
+
+    lookups = 0
+    scans = 0
+
+    def __getattribute__(self, name):
+        if not name.startswith('__'):
+            _TypesModule.lookups += 1
+        return types.ModuleType.__getattribute__(self, name)
+
+    def __dir__(self):
+        _TypesModule.scans += 1
+        return list(self.__dict__)
+
+
+def _register_module(name, verbose=False):
+    module = sys.modules[name]
+    for value in list(vars(module).values()):
+        if isinstance(value, type) and issubclass(value, bpy_struct) and value.__module__ == name:
+            _register_class(value)
+
+
+def _unregister_module(name, verbose=False):
+    module = sys.modules[name]
+    for value in list(vars(module).values()):
+        if isinstance(value, type) and issubclass(value, bpy_struct) and value.__module__ == name:
+            _unregister_class(value)
+
+
+def _register_class(cls):
+    bpy = sys.modules['bpy']
+    idname = getattr(cls, 'bl_idname', '') or cls.__name__
+    if issubclass(cls, Operator) and '.' in idname:
+        bpy.ops.classes[idname] = cls
+        category, name = idname.split('.')
+        setattr(bpy.types, '%s_OT_%s' % (category.upper(), name), cls)
+    else:
+        setattr(bpy.types, cls.__name__, cls)
+
+
+def _unregister_class(cls):
+    bpy = sys.modules['bpy']
+    idname = getattr(cls, 'bl_idname', '') or cls.__name__
+    if issubclass(cls, Operator) and '.' in idname:
+        bpy.ops.classes.pop(idname, None)
+
+
+def _persistent(func):
+    func._bpy_persistent = True
+    return func
+
+
+MENUS = (
+    ('INFO_MT_mesh_add', 'Mesh'),
+    ('INFO_MT_curve_add', 'Curve'),
+    ('INFO_MT_add', 'Add'),
+    ('VIEW3D_MT_object', 'Object'),
+    ('VIEW3D_MT_edit_mesh', 'Mesh'),
+    ('VIEW3D_MT_view', 'View'),
+)
+
+
+BUILTIN_OPS = (
+    'mesh.primitive_cube_add', 'mesh.primitive_uv_sphere_add', 'mesh.subdivide',
+    'object.shade_smooth', 'object.modifier_add', 'transform.translate',
+    'wm.call_menu', 'ed.undo_push', 'screen.repeat_last',
+)
+
+
+def install(tempdir=None, extra_menus=0, extra_types=0):
+    """Install the stand-ins into sys.modules and return the bpy module.
+
+    Every call starts from a clean state: new context, no registered
+    operators or draw handlers and empty call logs.  ``extra_menus`` and
+    ``extra_types`` pad bpy.types to approximate a real session.
+    """
+    SpaceView3D._handlers = []
+    _TypesModule.lookups = 0
+    _TypesModule.scans = 0
+    gl_log.clear()
+    rna_log.clear()
+    bpy = types.ModuleType('bpy')
+    bpy_types = _TypesModule('bpy.types')
+    bpy_props = types.ModuleType('bpy.props')
+    bpy_app = types.ModuleType('bpy.app')
+    bpy_handlers = types.ModuleType('bpy.app.handlers')
+    bpy_utils = types.ModuleType('bpy.utils')
+    bpy_path = types.ModuleType('bpy.path')
+    bpy_path.abspath = lambda path: path
+
+    for cls in (bpy_struct, PropertyGroup, Operator, AddonPreferences, Panel, UIList, UI_UL_list,
+                Menu, SpaceView3D, WindowManager):
+        setattr(bpy_types, cls.__name__, cls)
+    for name, label in MENUS + tuple(('VIEW3D_MT_extra_%i' % i, 'Extra %i' % i) for i in range(extra_menus)):
+        setattr(bpy_types, name, _StructMeta(name, (Menu,), {'bl_idname': name, 'bl_label': label}))
+    for name in BUILTIN_OPS:
+        idname = '%s_OT_%s' % (name.split('.')[0].upper(), name.split('.')[1])
+        setattr(bpy_types, idname, _StructMeta(idname, (Operator,), {'bl_idname': name}))
+    for i in range(extra_types):
+        setattr(bpy_types, 'OBJECT_PT_extra_%i' % i, _StructMeta('OBJECT_PT_extra_%i' % i, (Panel,), {}))
+
+    for name in ('StringProperty', 'IntProperty', 'FloatProperty', 'BoolProperty',
+                 'EnumProperty', 'CollectionProperty', 'PointerProperty',
+                 'FloatVectorProperty', 'IntVectorProperty'):
+        setattr(bpy_props, name, globals()[name])
+    bpy_props.__all__ = [n for n in dir(bpy_props) if n.endswith('Property')]
+
+    bpy_handlers.persistent = _persistent
+    bpy_handlers.load_post = []
+    bpy_handlers.save_pre = []
+    bpy_handlers.save_post = []
+    bpy_handlers.scene_update_post = []
+    bpy_app.handlers = bpy_handlers
+    bpy_app.tempdir = (tempdir or tempfile.mkdtemp(prefix='pins_bench_')).rstrip('/') + '/'
+    bpy_app.version = (2, 79, 0)
+    bpy_app.background = True
+
+    bpy_utils.user_resource = lambda kind, path='', create=False: bpy_app.tempdir + path
+    bpy_utils.register_module = _register_module
+    bpy_utils.unregister_module = _unregister_module
+    bpy_utils.register_class = _register_class
+    bpy_utils.unregister_class = _unregister_class
+
+    bpy.types = bpy_types
+    bpy.props = bpy_props
+    bpy.app = bpy_app
+    bpy.utils = bpy_utils
+    bpy.path = bpy_path
+    bpy.ops = _Ops()
+    bpy.context = Context()
+    bpy.Event = Event
+
+    sys.modules.update({
+        'bpy': bpy,
+        'bpy.types': bpy_types,
+        'bpy.props': bpy_props,
+        'bpy.app': bpy_app,
+        'bpy.app.handlers': bpy_handlers,
+        'bpy.utils': bpy_utils,
+        'bpy.path': bpy_path,
+        'bgl': _make_bgl(),
+        'blf': _make_blf(),
+    })
+    return bpy
+
+
+def _make_bgl():
+    bgl = types.ModuleType('bgl')
+    for i, name in enumerate(('GL_BLEND', 'GL_LINE_LOOP', 'GL_LINES', 'GL_QUADS',
+                              'GL_TRIANGLES', 'GL_TEXTURE_2D', 'GL_PROJECTION',
+                              'GL_MODELVIEW', 'GL_COLOR_BUFFER_BIT', 'GL_FLOAT',
+                              'GL_VERTEX_ARRAY', 'GL_COLOR_ARRAY', 'GL_SRC_ALPHA',
+                              'GL_ONE_MINUS_SRC_ALPHA', 'GL_ONE', 'GL_VIEWPORT',
+                              'GL_INT', 'GL_TEXTURE_MIN_FILTER', 'GL_TEXTURE_MAG_FILTER',
+                              'GL_NEAREST', 'GL_LINEAR', 'GL_BLEND_SRC', 'GL_BLEND_DST')):
+        setattr(bgl, name, i + 1)
+
+    def recorder(name):
+        def call(*args):
+            gl_log(name, *args)
+        call.__name__ = name
+        return call
+
+    for name in ('glEnable', 'glDisable', 'glBegin', 'glEnd', 'glColor4f', 'glColor3f',
+                 'glVertex2f', 'glTexCoord2f', 'glBindTexture', 'glBlendFunc',
+                 'glMatrixMode', 'glPushMatrix', 'glPopMatrix', 'glLoadIdentity',
+                 'glOrtho', 'glClearColor', 'glClear', 'glLineWidth', 'glTexParameteri',
+                 'glGetIntegerv', 'glViewport'):
+        setattr(bgl, name, recorder(name))
+
+    class Buffer(list):
+        def __init__(self, kind, size, data=None):
+            super(Buffer, self).__init__(data if data is not None else [0] * size)
+
+    bgl.Buffer = Buffer
+    return bgl
+
+
+def _make_blf():
+    blf = types.ModuleType('blf')
+
+    def recorder(name):
+        def call(*args):
+            gl_log('blf.' + name, *args)
+        return call
+
+    for name in ('size', 'position', 'draw', 'enable', 'disable', 'clipping'):
+        setattr(blf, name, recorder(name))
+    blf.dimensions = lambda font, text: (len(text) * 6.0, 10.0)
+    return blf
+
+
+def load_addon(path, name='space_view3d_3d_pins'):
+    """Import the addon file unchanged under ``name``."""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
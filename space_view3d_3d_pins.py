@@ -33,12 +33,103 @@ import bpy
 import bgl
 import blf
 import os.path
+import sys
+import ast
+import mmap
 import pickle
+import json
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
+from heapq import nsmallest
 from bpy.props import *
-from time import time
+from time import time, perf_counter
+from functools import wraps
+from collections import deque
 from random import randint
 from bpy.app.handlers import persistent
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import gpu
+except ImportError:
+    gpu = None
+
+class PinsStats:
+    enabled = False
+    samples = 256
+    
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.lock = threading.Lock() #the saver thread records timings too
+    
+    def add(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = [0, deque(maxlen=self.samples)]
+            timing[0] += 1
+            timing[1].append(seconds)
+    
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+    
+    def summary(self):
+        with self.lock:
+            recorded = [(name, count, list(samples)) for name, (count, samples) in self.timings.items()]
+            counters = dict(self.counters)
+        timings = {}
+        for name, count, samples in recorded:
+            ordered = sorted(samples)
+            timings[name] = {
+                'count': count,
+                'p50': ordered[int(0.5 * (len(ordered) - 1))] * 1000,
+                'p95': ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+                'max': ordered[-1] * 1000,
+            }
+        counters['style_lookups'] = _pins_style.lookups
+        counters['style_lookups_saved'] = _pins_style.saved
+        counters['pin_calls_cached'] = len(_pin_calls)
+        counters['pins_drawn'] = len(_pins_layout.drawn)
+        counters['pins_culled'] = _pins_layout.culled
+        counters['pins_hidden'] = _pins_layout.hidden
+        counters['overlay_renders'] = _pins_overlay.renders
+        return {'version': bl_info["version"], 'timings': timings, 'counters': counters}
+    
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+_pins_stats = PinsStats()
+
+def timed(name):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PinsStats.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _pins_stats.add(name, perf_counter() - start)
+        return wrapper
+    return decorate
+
+def pins_stats_update(self, context):
+    PinsStats.enabled = self.stats_enabled
+
 def active_preset_id(context):
     wm = context.window_manager
     if not len(wm.pins_presets):
@@ -46,44 +137,561 @@ def active_preset_id(context):
     preset = wm.pins_presets[wm.pins_presets_active_index]
     return preset.id
 
-def save_pins(context):
+class PinsIndex:
+    generation = 0
+    
+    def __init__(self):
+        self.key = None
+        self.by_id = {}
+        self.by_preset = {}
+        self.preset = "0"
+        self.active = []
+    
+    def rebuild(self, wm, key):
+        self.key = key
+        self.by_id = {}
+        self.by_preset = {}
+        for i, pin in enumerate(wm.pins_data):
+            self.by_id.setdefault(pin.id, i)
+            self.by_preset.setdefault(pin.preset, []).append(i)
+        if not len(wm.pins_presets):
+            self.preset = "0"
+        else:
+            self.preset = wm.pins_presets[wm.pins_presets_active_index].id
+        self.active = self.by_preset.get(self.preset, [])
+
+_pins_index = PinsIndex()
+
+def touch_pins():
+    PinsIndex.generation += 1
+
+def pins_index(context):
     wm = context.window_manager
+    key = (PinsIndex.generation, wm.pins_presets_active_index, len(wm.pins_data), len(wm.pins_presets))
+    if _pins_index.key != key:
+        _pins_index.rebuild(wm, key)
+    return _pins_index
+
+PIN_FIELDS = ('id', 'preset', 'text', 'mode', 'type', 'call', 'op', 'x', 'y', 'set', 'parent', 'align')
+PRESET_FIELDS = ('name', 'id')
+
+PINS_MAGIC = b'PINS'
+PINS_FORMAT = 2
+
+class PinsTable:
+    numbers = (('x', 'f'), ('y', 'f'), ('align', 'i'), ('type', 'i'), ('set', 'B'))
+    strings = ('id', 'preset', 'text', 'mode', 'call', 'op', 'parent')
+    filling = False
+    
+    def __init__(self):
+        for k, typecode in self.numbers:
+            setattr(self, k, array(typecode))
+        for k in self.strings:
+            setattr(self, k, [])
+        self.rows = None
+    
+    def __len__(self):
+        return len(self.id)
+    
+    @classmethod
+    def from_rna(cls, collection):
+        table = cls()
+        n = len(collection)
+        for k, typecode in cls.numbers:
+            column = array(typecode, [0]) * n
+            collection.foreach_get(k, column)
+            setattr(table, k, column)
+        for k in cls.strings:
+            setattr(table, k, [getattr(item, k) for item in collection])
+        return table
+    
+    @classmethod
+    def from_rows(cls, rows):
+        table = cls()
+        for row in rows:
+            table.upsert(row)
+        return table
+    
+    def to_rna(self, collection):
+        collection.clear()
+        for i in range(len(self)):
+            collection.add()
+        for k, typecode in self.numbers:
+            collection.foreach_set(k, getattr(self, k))
+        PinsTable.filling = True
+        try:
+            for k in self.strings:
+                for item, value in zip(collection, getattr(self, k)):
+                    setattr(item, k, value)
+        finally:
+            PinsTable.filling = False
+    
+    def row(self, i):
+        return {k: getattr(self, k)[i] for k in PIN_FIELDS}
+    
+    def lookup(self):
+        if self.rows is None:
+            self.rows = {id: i for i, id in enumerate(self.id)}
+        return self.rows
+    
+    def upsert(self, record):
+        rows = self.lookup()
+        i = rows.get(record.get('id'))
+        if i is None:
+            rows[record.get('id')] = len(self)
+            for k, typecode in self.numbers:
+                getattr(self, k).append(record.get(k, 0))
+            for k in self.strings:
+                getattr(self, k).append(record.get(k, "0" if k in ('preset', 'parent') else ""))
+            return
+        for k in record:
+            if k in PIN_FIELDS:
+                getattr(self, k)[i] = record[k]
+    
+    def extend(self, other):
+        for k in PIN_FIELDS:
+            getattr(self, k).extend(getattr(other, k))
+        self.rows = None
+    
+    def upsert_rows(self, other):
+        for i in range(len(other)):
+            self.upsert(other.row(i))
+    
+    def subset(self, rows):
+        table = PinsTable()
+        for k, typecode in self.numbers:
+            column = getattr(self, k)
+            setattr(table, k, array(typecode, [column[i] for i in rows]))
+        for k in self.strings:
+            column = getattr(self, k)
+            setattr(table, k, [column[i] for i in rows])
+        return table
+    
+    def select(self, mask):
+        return self.subset([i for i, m in enumerate(mask) if m])
+    
+    def remove(self, keep):
+        kept = self.select(keep)
+        for k in PIN_FIELDS:
+            setattr(self, k, getattr(kept, k))
+        self.rows = None
+    
+    def split(self):
+        rows = OrderedDict()
+        for i, preset in enumerate(self.preset):
+            rows.setdefault(preset, []).append(i)
+        return OrderedDict((preset, self.subset(rows[preset])) for preset in rows)
+    
+    def clone_ids(self, stamp):
+        return {id: "%s%i" % (stamp, i) for i, id in enumerate(self.id)}
+    
+    def clone(self, preset, ids):
+        table = self.subset([i for i, id in enumerate(self.id) if id in ids])
+        table.id = [ids[id] for id in table.id]
+        table.parent = [ids.get(parent, parent) for parent in table.parent]
+        table.preset = [preset] * len(table)
+        return table
+    
+    def remove_pin(self, id):
+        if id not in self.lookup():
+            return
+        self.remove([pin != id for pin in self.id])
+        self.parent = ["0" if parent == id else parent for parent in self.parent]
+    
+    def remove_pins(self, ids):
+        if not ids:
+            return
+        self.remove([pin not in ids for pin in self.id])
+        self.parent = ["0" if parent in ids else parent for parent in self.parent]
+    
+    def remove_preset(self, id):
+        self.remove([preset != id for preset in self.preset])
+    
+    def copy_preset(self, source, target, ids):
+        self.upsert_rows(self.select([preset == source for preset in self.preset]).clone(target, ids))
+    
+    def merge_preset(self, source, target):
+        self.preset = [target if preset == source else preset for preset in self.preset]
+    
+    def encode(self):
+        strings = {}
+        columns = []
+        blobs = []
+        offset = 0
+        for k, typecode in self.numbers:
+            columns.append([k, typecode, offset, len(getattr(self, k))])
+            blobs.append(getattr(self, k).tobytes())
+            offset += len(blobs[-1])
+        for k in self.strings:
+            column = array('I', [strings.setdefault(value, len(strings)) for value in getattr(self, k)])
+            columns.append([k, 'I', offset, len(column)])
+            blobs.append(column.tobytes())
+            offset += len(blobs[-1])
+        table = '\0'.join(sorted(strings, key=strings.get)).encode('utf-8')
+        columns.append(['', 's', offset, len(strings)])
+        blobs.append(table)
+        return columns, b''.join(blobs)
+    
+    @classmethod
+    def decode(cls, columns, blob, swap=False):
+        table = cls()
+        strings = None
+        with memoryview(blob) as view:
+            for k, typecode, offset, count in reversed(columns):
+                if typecode == 's':
+                    strings = bytes(view[offset:]).decode('utf-8').split('\0') if count else []
+                    continue
+                column = array(typecode)
+                column.frombytes(view[offset:offset + count * column.itemsize])
+                if swap:
+                    column.byteswap()
+                if typecode == 'I':
+                    column = [strings[i] for i in column]
+                setattr(table, k, column)
+        return table
+
+def migrate_pickle(data):
+    data['pins'] = PinsTable.from_rows(data.get('pins') or [])
+    data['presets'] = data.get('presets') or []
+    data['format'] = 1
+    return data
+
+def migrate_op_column(data):
+    table = data['pins']
+    if len(table.op) != len(table):
+        table.op = [""] * len(table)
+    data['format'] = 2
+    return data
+
+PINS_MIGRATIONS = {0: migrate_pickle, 1: migrate_op_column}
+
+def encode_pins(data):
+    header = {k: v for k, v in data.items() if k != 'pins'}
+    header['format'] = PINS_FORMAT
+    header['byteorder'] = sys.byteorder
+    header['columns'], blob = data['pins'].encode()
+    return header, blob
+
+def write_pins(file_path, header, blob):
+    header = json.dumps(header).encode('utf-8')
+    with open(file_path + ".tmp", "wb") as f:
+        f.write(PINS_MAGIC + struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(blob)
+    os.replace(file_path + ".tmp", file_path)
+
+def read_pins(file_path):
+    with open(file_path, "rb") as f:
+        if f.read(4) != PINS_MAGIC:
+            f.seek(0)
+            data = pickle.load(f)
+            data['format'] = 0
+        else:
+            header = json.loads(f.read(struct.unpack('<I', f.read(4))[0]).decode('utf-8'))
+            start = f.tell()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                with memoryview(buffer) as view:
+                    data = header
+                    data['pins'] = PinsTable.decode(header.pop('columns'), view[start:], header.get('byteorder') != sys.byteorder)
+    while data['format'] < PINS_FORMAT:
+        data = PINS_MIGRATIONS[data['format']](data)
+    return data
+
+class PinsStore:
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.preset = None
+    
+    def load(self, context, table):
+        self.buckets = table.split()
+        self.preset = None
+        context.window_manager.pins_data.clear()
+        self.sync(context)
+    
+    def stash(self, table):
+        for preset, rows in table.split().items():
+            if preset in self.buckets:
+                self.buckets[preset].extend(rows)
+            else:
+                self.buckets[preset] = rows
+    
+    def sync(self, context):
+        wm = context.window_manager
+        preset = active_preset_id(context)
+        if preset == self.preset:
+            return
+        if len(wm.pins_data):
+            self.stash(PinsTable.from_rna(wm.pins_data))
+        table = self.buckets.pop(preset, None)
+        if table is None:
+            wm.pins_data.clear()
+        else:
+            table.to_rna(wm.pins_data)
+        self.preset = preset
+        touch_pins()
+    
+    def table(self, context, preset):
+        if preset == self.preset:
+            return PinsTable.from_rna(context.window_manager.pins_data)
+        return self.buckets.get(preset, PinsTable())
     
+    def add(self, context, preset, table):
+        if preset == self.preset:
+            rows = PinsTable.from_rna(context.window_manager.pins_data)
+            rows.extend(table)
+            rows.to_rna(context.window_manager.pins_data)
+        else:
+            self.stash(table)
+    
+    def drop(self, context, preset):
+        if preset == self.preset:
+            context.window_manager.pins_data.clear()
+        else:
+            self.buckets.pop(preset, None)
+    
+    def copy(self, context, source, target, stamp):
+        table = self.table(context, source)
+        ids = table.clone_ids(stamp)
+        self.add(context, target, table.clone(target, ids))
+        return ids
+    
+    def merge(self, context, source, target):
+        table = self.table(context, source)
+        table.preset = [target] * len(table)
+        self.drop(context, source)
+        self.add(context, target, table)
+    
+    def put(self, context, preset, table):
+        if preset == self.preset:
+            table.to_rna(context.window_manager.pins_data)
+        elif len(table):
+            self.buckets[preset] = table
+        else:
+            self.buckets.pop(preset, None)
+    
+    def owners(self, context):
+        owners = {}
+        for preset, rows in self.buckets.items():
+            owners.update(dict.fromkeys(rows.id, preset))
+        for pin in context.window_manager.pins_data:
+            owners[pin.id] = pin.preset
+        return owners
+    
+    def snapshot(self, wm):
+        table = PinsTable()
+        for rows in self.buckets.values():
+            table.extend(rows)
+        table.extend(PinsTable.from_rna(wm.pins_data))
+        return table
+
+_pins_store = PinsStore()
+
+def pins_preset_update(self, context):
+    _pins_store.sync(context)
+
+def pins_file():
+    return bpy.app.tempdir + "blender_pins.dat"
+
+def pins_snapshot(wm):
     data = {}
     data['version'] = bl_info["version"]
-    data['pins_enabled'] = wm.pins_enabled
-    data['pins_opacity'] = wm.pins_opacity
-    data['pins_presets_active_index'] = wm.pins_presets_active_index
-    data['pins'] = []
-    for pin in wm.pins_data:
-        pin_dict = {}
-        for k in pin.keys():
-            pin_dict[k] = getattr(pin, k)
-        data['pins'].append(pin_dict)
-    data['presets'] = []
-    for preset in wm.pins_presets:
-        preset_dict = {}
-        for k in preset.keys():
-            preset_dict[k] = getattr(preset, k)
-        data['presets'].append(preset_dict)
-            
-    file_path = bpy.app.tempdir + "blender_pins.dat"
-    pickle.dump(data, open(file_path, "wb"), protocol=pickle.HIGHEST_PROTOCOL)
+    data.update(state_record(wm))
+    data['pins'] = _pins_store.snapshot(wm)
+    data['presets'] = [preset_record(preset) for preset in wm.pins_presets]
+    return data
+
+def pin_record(pin):
+    return {k: getattr(pin, k) for k in PIN_FIELDS}
+
+def preset_record(preset):
+    return {k: getattr(preset, k) for k in PRESET_FIELDS}
+
+def state_record(wm):
+    return {'pins_enabled': wm.pins_enabled, 'pins_opacity': wm.pins_opacity, 'pins_presets_active_index': wm.pins_presets_active_index}
+
+class PinsSaver:
+    def __init__(self):
+        self.pending = None
+        self.digest = None
+        self.saved_seq = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.stopping = False
+    
+    def submit(self, context, seq):
+        data = pins_snapshot(context.window_manager)
+        with self.lock:
+            self.pending = (seq, data, pins_file())
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name="PinsSaver")
+            self.thread.daemon = True
+            self.thread.start()
+        self.wake.set()
+    
+    def run(self):
+        while not self.stopping:
+            self.wake.wait()
+            self.wake.clear()
+            self.write()
     
-    #print("[Pins] Saved %i pin(s), %i preset(s)." % (len(data['pins']), len(data['presets'])))
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopping = True
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+        self.stopping = False
+    
+    @timed('write_snapshot')
+    def write(self):
+        with self.lock:
+            if self.pending is None:
+                return
+            seq, data, path = self.pending
+            self.pending = None
+            header, blob = encode_pins(data)
+            digest = hashlib.sha1(json.dumps(header, sort_keys=True).encode('utf-8') + blob).digest()
+            if digest != self.digest:
+                header['seq'] = seq
+                write_pins(path, header, blob)
+                self.digest = digest
+            self.saved_seq = seq
+
+_pins_saver = PinsSaver()
 
+class PinsJournal:
+    limit = 64 * 1024
+    
+    def __init__(self):
+        self.seq = 0
+        self.size = 0
+        self.compacting = None
+        self.tail = []
+    
+    def path(self):
+        return bpy.app.tempdir + "blender_pins.journal"
+    
+    def append(self, context, op, payload):
+        self.poll()
+        self.seq += 1
+        data = json.dumps([self.seq, op, payload]).encode('utf-8')
+        record = struct.pack('<I', len(data)) + data
+        with open(self.path(), "ab") as f:
+            f.write(record)
+        self.size += len(record)
+        if self.compacting is not None:
+            self.tail.append(record)
+        elif self.size >= self.limit:
+            self.compact(context)
+    
+    def compact(self, context):
+        self.compacting = self.seq
+        self.tail = []
+        _pins_saver.submit(context, self.seq)
+    
+    def poll(self):
+        if self.compacting is None or _pins_saver.saved_seq < self.compacting:
+            return
+        file_path = self.path()
+        with open(file_path + ".tmp", "wb") as f:
+            for record in self.tail:
+                f.write(record)
+        os.replace(file_path + ".tmp", file_path)
+        self.size = sum(len(record) for record in self.tail)
+        self.compacting = None
+        self.tail = []
+    
+    def flush(self, context):
+        self.compact(context)
+        _pins_saver.write()
+        self.poll()
+    
+    def read(self, seq):
+        self.seq = seq
+        self.size = 0
+        file_path = self.path()
+        if not os.path.isfile(file_path):
+            return
+        with open(file_path, "rb") as f:
+            buffer = f.read()
+        offset = 0
+        while offset + 4 <= len(buffer):
+            length = struct.unpack_from('<I', buffer, offset)[0]
+            if offset + 4 + length > len(buffer):
+                break
+            try:
+                record_seq, op, payload = json.loads(buffer[offset + 4:offset + 4 + length].decode('utf-8'))
+            except ValueError:
+                break
+            offset += 4 + length
+            self.seq = max(self.seq, record_seq)
+            if record_seq > seq:
+                yield op, payload
+        self.size = offset
+        if offset != len(buffer):
+            print("[Pins] Dropped %i byte(s) of incomplete journal." % (len(buffer) - offset))
+            with open(file_path, "r+b") as f:
+                f.truncate(offset)
+
+_pins_journal = PinsJournal()
+
+def replay_record(data, presets, op, payload):
+    if op == 'pin':
+        data['pins'].upsert(payload)
+    elif op == 'unpin':
+        data['pins'].remove_pin(payload)
+    elif op == 'preset':
+        preset = presets.setdefault(payload['id'], {})
+        preset.update(payload)
+    elif op == 'unpreset':
+        presets.pop(payload, None)
+        data['pins'].remove_preset(payload)
+    elif op == 'copy':
+        pins = data['pins']
+        ids = payload.get('ids')
+        if ids is None: #older records only carry the stamp
+            ids = pins.select([preset == payload['source'] for preset in pins.preset]).clone_ids(payload['stamp'])
+        pins.copy_preset(payload['source'], payload['target'], ids)
+    elif op == 'merge':
+        presets.pop(payload['source'], None)
+        data['pins'].merge_preset(payload['source'], payload['target'])
+    elif op == 'unpins':
+        data['pins'].remove_pins(set(payload))
+    elif op == 'batch':
+        for record in payload:
+            replay_record(data, presets, *record)
+    elif op == 'state':
+        data.update(payload)
+
+@timed('save_pins')
+def journal_pins(context, op, payload):
+    _pins_journal.append(context, op, payload)
+
+def save_pins(context):
+    journal_pins(context, 'state', state_record(context.window_manager))
+
+@timed('load_pins')
 def load_pins(context):
 
-    file_path = bpy.app.tempdir + "blender_pins.dat"
-    if not os.path.isfile(file_path):
+    file_path = pins_file()
+    if os.path.isfile(file_path):
+        data = read_pins(file_path)
+    elif os.path.isfile(_pins_journal.path()):
+        data = {'format': PINS_FORMAT, 'pins': PinsTable(), 'presets': []}
+    else:
         return
- 
-    data = pickle.load(open(file_path, "rb"))
     
-    if data.get('version') != bl_info["version"]:
-        print("[Pins] Existing pins data is incompatible, loading cancelled.")
+    if data['format'] > PINS_FORMAT:
+        print("[Pins] Existing pins data is from a newer version, loading cancelled.")
         return
     
+    presets = OrderedDict((preset.get('id'), preset) for preset in data['presets'])
+    for op, payload in _pins_journal.read(data.get('seq', 0)):
+        replay_record(data, presets, op, payload)
+    presets = list(presets.values())
+    
     wm = context.window_manager
     
     try:
@@ -92,166 +700,827 @@ def load_pins(context):
     except:
         pass
     
-    pins = data.get('pins')
-    if pins:
-        for pin in pins:
-            new_pin = wm.pins_data.add()
-            for k in pin:
-                if hasattr(new_pin, k):
-                    setattr(new_pin, k, pin[k])
+    pins = data['pins']
+    count = len(pins)
             
-    presets = data.get('presets')
-    if presets:
-        for preset in presets:
-            new_preset = wm.pins_presets.add()
-            for k in preset:
-                if hasattr(new_preset, k):
-                    setattr(new_preset, k, preset[k])
+    for preset in presets:
+        new_preset = wm.pins_presets.add()
+        for k in preset:
+            if hasattr(new_preset, k):
+                setattr(new_preset, k, preset[k])
+    
+    _pins_store.load(context, pins)
     
     if data.get('pins_enabled') is True:
         wm.pins_invoke = True
     
+    touch_pins()
     wm.pins_loaded = True
-    print("[Pins] Loaded %i pin(s), %i preset(s)." % (len(pins), len(presets)))
+    print("[Pins] Loaded %i pin(s), %i preset(s)." % (count, len(presets)))
         
-def draw_pin(text, mx, my, bx, by, w, h, t, f):
-    dFont = 0
-    bx -= w/2
-    bx2 = bx + w
-    by2 = by - h/2
-    by += h/2
-    
-    if bx <= mx <= bx2 and by2 <= my <= by: hover = True
-    else: hover = False
-    
-    if hover: col = bpy.context.user_preferences.themes[0].user_interface.wcol_menu_item.inner_sel
-    else: col = bpy.context.user_preferences.themes[0].user_interface.wcol_menu.inner_sel
-    if f: col = [1.0, 0.0, 0.0]
-    dR = col[0]
-    dG = col[1]
-    dB = col[2]
-    dA = bpy.context.window_manager.pins_opacity
-    
-    positions = [[bx, by], [bx2, by], [bx2, by2], [bx, by2]]
-    settings = [[bgl.GL_LINE_LOOP, 0.8], [bgl.GL_QUADS, dA]]
-    for mode, box_alpha in settings:
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glBegin(mode)
-        bgl.glColor4f(dR, dG, dB, box_alpha)
-        for v1, v2 in positions:
-            bgl.glVertex2f(v1, v2)
-        bgl.glEnd()
+PIN_DEFAULTS = {'text': "Pin", 'mode': "", 'type': 0, 'call': "", 'op': "", 'x': 0.5, 'y': 0.5, 'set': True, 'parent': "0", 'align': 0}
+
+def new_pin_id():
+    return "%s%i" % (str(time()).replace('.',''), randint(0, 1000))
+
+class PinsTransaction:
+    def __init__(self, context):
+        self.context = context
+        self.presets = OrderedDict()
+        self.records = OrderedDict()
+        self.added = set()
+        self.removed = set()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.commit()
+    
+    def add_preset(self, name="New Preset", id=None):
+        id = id or new_pin_id()
+        self.presets[id] = {'name': name, 'id': id}
+        return id
+    
+    def add(self, **fields):
+        id = fields.get('id') or new_pin_id()
+        self.removed.discard(id)
+        self.added.add(id)
+        record = self.records.setdefault(id, {'id': id})
+        record.update((k, v) for k, v in fields.items() if k in PIN_FIELDS)
+        record['id'] = id
+        return id
+    
+    def update(self, id, **fields):
+        if id in self.removed:
+            raise ValueError("Pin %s is removed in this transaction" % id)
+        self.records.setdefault(id, {'id': id}).update((k, v) for k, v in fields.items() if k in PIN_FIELDS and k != 'id')
+    
+    def move(self, id, x, y):
+        self.update(id, x=x, y=y)
+    
+    def reparent(self, id, parent="0", align=0):
+        self.update(id, parent=parent, align=align)
+    
+    def remove(self, id):
+        self.records.pop(id, None)
+        self.removed.add(id)
+    
+    def validate(self, owners):
+        wm = self.context.window_manager
+        presets = set(preset.id for preset in wm.pins_presets) | set(self.presets)
+        if len(wm.pins_presets) or not self.presets:
+            default = active_preset_id(self.context)
+        else:
+            default = next(iter(self.presets))
+        for id in self.removed:
+            if id not in owners:
+                raise ValueError("Pin %s does not exist" % id)
+        for id, record in self.records.items():
+            preset = owners.get(id)
+            if preset is None:
+                if id not in self.added:
+                    raise ValueError("Pin %s does not exist" % id)
+                record.setdefault('preset', default)
+                for k, v in PIN_DEFAULTS.items():
+                    record.setdefault(k, v)
+            elif record.get('preset', preset) != preset:
+                raise ValueError("Pin %s belongs to another preset" % id)
+            preset = record.get('preset', preset)
+            if preset not in presets:
+                raise ValueError("Pin %s refers to an unknown preset" % id)
+            owners[id] = preset
+        for id in self.removed:
+            owners.pop(id, None)
+        for id, record in self.records.items():
+            parent = record.get('parent', "0")
+            if parent != "0" and (parent == id or owners.get(parent) != owners[id]):
+                raise ValueError("Pin %s has an invalid parent %s" % (id, parent))
+            if record.get('align', 0) not in (0, 1, 2, 3):
+                raise ValueError("Pin %s has an invalid alignment" % id)
+            if record.get('type') == 1 and ('call' in record or 'op' in record):
+                compile_pin_call(record.get('op') or record.get('call'))
+            elif record.get('type') == 2:
+                compile_macro(record.get('op', ""))
+    
+    def commit(self):
+        context = self.context
+        wm = context.window_manager
+        _pins_store.sync(context)
+        owners = _pins_store.owners(context)
+        removed = {id: owners.get(id) for id in self.removed}
+        self.validate(owners)
         
+        journal = []
+        existing = set(preset.id for preset in wm.pins_presets)
+        for id, record in self.presets.items():
+            if id in existing: continue
+            new_preset = wm.pins_presets.add()
+            new_preset.name = record['name']
+            new_preset.id = id
+            journal.append(['preset', preset_record(new_preset)])
+        _pins_store.sync(context)
+        
+        touched = OrderedDict()
+        for id, preset in removed.items():
+            touched.setdefault(preset, [set(), []])[0].add(id)
+        for id, record in self.records.items():
+            touched.setdefault(owners[id], [set(), []])[1].append(record)
+        if removed:
+            journal.append(['unpins', sorted(removed)])
+        for preset, (ids, records) in touched.items():
+            table = _pins_store.table(context, preset)
+            table.remove_pins(ids)
+            for record in records:
+                table.upsert(record)
+            rows = table.lookup()
+            journal.extend(['pin', table.row(rows[record['id']])] for record in records)
+            _pins_store.put(context, preset, table)
+        
+        touch_pins()
+        if journal:
+            journal_pins(context, 'batch', journal)
+        return len(self.records)
+
+def pins_transaction(context):
+    return PinsTransaction(context)
+
+def export_pins(context, file_path, presets=None):
+    wm = context.window_manager
+    count = 0
+    with open(file_path, "w") as f:
+        for preset in wm.pins_presets:
+            if presets is not None and preset.id not in presets: continue
+            f.write(json.dumps({'preset': preset_record(preset)}, sort_keys=True) + "\n")
+            table = _pins_store.table(context, preset.id)
+            for i in range(len(table)):
+                f.write(json.dumps({'pin': table.row(i)}, sort_keys=True) + "\n")
+            count += len(table)
+    return count
+
+def import_pins(context, file_path):
+    count = 0
+    transaction = pins_transaction(context)
+    with open(file_path, "r") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError("Line %i is not valid JSON" % number)
+            if 'preset' in record:
+                if transaction.records: #commit one preset at a time so memory stays bounded
+                    count += transaction.commit()
+                    transaction = pins_transaction(context)
+                transaction.add_preset(**record['preset'])
+            elif 'pin' in record:
+                transaction.add(**record['pin'])
+    return count + transaction.commit()
+
+class PinsStyle:
+    def __init__(self):
+        self.style = None
+        self.lookups = 0
+        self.saved = 0
+    
+    def resolve(self, context):
+        ui = context.user_preferences.themes[0].user_interface
+        hover = ui.wcol_menu_item.inner_sel
+        normal = ui.wcol_menu.inner_sel
+        style = (hover[0], hover[1], hover[2], normal[0], normal[1], normal[2], 1.0, 0.0, 0.0, context.window_manager.pins_opacity)
+        self.lookups += 3
+        if style != self.style:
+            self.style = style
+        return self.style
+    
+    def count(self, pins):
+        self.saved += max(0, 2 * pins - 3)
+
+_pins_style = PinsStyle()
+
+class PinBatch:
+    def __init__(self):
+        self.lines = array('f')
+        self.line_colors = array('f')
+        self.quads = array('f')
+        self.quad_colors = array('f')
+        self.tris = array('f')
+        self.tri_colors = array('f')
+        self.texts = []
+    
+    @timed('draw_pin')
+    def add(self, text, mx, my, bx, by, w, h, t, f, style):
+        bx -= w/2
+        bx2 = bx + w
+        by2 = by - h/2
+        by += h/2
+        
+        hover = bx <= mx <= bx2 and by2 <= my <= by
+        
+        if f: col = style[6:9]
+        elif hover: col = style[0:3]
+        else: col = style[3:6]
+        
+        self.lines.extend((bx, by, bx2, by, bx2, by, bx2, by2, bx2, by2, bx, by2, bx, by2, bx, by))
+        self.line_colors.extend((col + (0.8,)) * 8)
+        self.quads.extend((bx, by, bx2, by, bx2, by2, bx, by2))
+        self.quad_colors.extend((col + style[9:10]) * 4)
+        self.texts.append((bx + 12, by - 14, text))
+        
+        if t == 0:
+            if by > 100: self.tris.extend((bx + 109, by - 7, bx + 112.5, by - 14, bx + 116, by - 7))
+            else: self.tris.extend((bx + 109, by - 13, bx + 112.5, by - 6, bx + 116, by - 13))
+            self.tri_colors.extend((1.0, 1.0, 1.0, 0.4) * 3)
+        elif t == 2:
+            self.tris.extend((bx + 106, by - 6, bx + 110, by - 11, bx + 106, by - 16, bx + 111, by - 6, bx + 115, by - 11, bx + 111, by - 16))
+            self.tri_colors.extend((1.0, 1.0, 1.0, 0.4) * 6)
+        
+        return hover
+
+def draw_vertices(mode, vertices, colors):
+    if not len(vertices): return
+    bgl.glBegin(mode)
+    last = None
+    for i in range(0, len(vertices) // 2):
+        col = colors[i*4:i*4 + 4]
+        if col != last:
+            bgl.glColor4f(*col)
+            last = col
+        bgl.glVertex2f(vertices[i*2], vertices[i*2 + 1])
+    bgl.glEnd()
+
+@timed('draw_batch')
+def draw_batch(batch):
+    dFont = 0
+    bgl.glEnable(bgl.GL_BLEND)
+    draw_vertices(bgl.GL_LINES, batch.lines, batch.line_colors)
+    draw_vertices(bgl.GL_QUADS, batch.quads, batch.quad_colors)
+    draw_vertices(bgl.GL_TRIANGLES, batch.tris, batch.tri_colors)
+    
     blf.size(dFont, 12, 72)
-    blf.position(dFont, bx + 12, by - 14, 0)
-    dR = 1.0
-    dG = 1.0
-    dB = 1.0
-    dA = 1.0
-    bgl.glColor4f(dR, dG, dB, dA)
-    blf.draw(dFont, text)
-    
-    if t == 0:
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glBegin(bgl.GL_TRIANGLES)
-        dA = 0.4
-        bgl.glColor4f(dR, dG, dB, dA)
-        if by > 100: arrow = [[bx + 109, by - 7], [bx + 112.5, by - 14], [bx + 116, by - 7]]
-        else: arrow = [[bx + 109, by - 13], [bx + 112.5, by - 6], [bx + 116, by - 13]]
-        for v1, v2 in arrow:
-            bgl.glVertex2f(v1, v2)
-        bgl.glEnd()
+    bgl.glColor4f(1.0, 1.0, 1.0, 1.0)
+    for x, y, text in batch.texts:
+        blf.position(dFont, x, y, 0)
+        blf.draw(dFont, text)
+
+class SnapGrid:
+    cell = 128
+    
+    def __init__(self, index, layout, w, h):
+        self.key = (index.key, w, h)
+        self.cells = {}
+        self.children = {}
+        for i in index.active:
+            id = layout.states[i].id
+            self.children.setdefault(layout.parent_id(i), []).append(id)
+            if not layout.flags[i] & LAYOUT_SET: continue
+            bx = float(layout.x[i]) * w
+            by = float(layout.y[i]) * h
+            entry = (id, bx, by)
+            for cx in range(int((bx - 110) // self.cell), int((bx + 110) // self.cell) + 1):
+                for cy in range(int((by - 30) // self.cell), int((by + 30) // self.cell) + 1):
+                    self.cells.setdefault((cx, cy), []).append(entry)
+        self.excluded = {}
     
-    return hover
+    def subtree(self, id):
+        ids = self.excluded.get(id)
+        if ids is None:
+            ids = {id}
+            stack = [id]
+            while stack:
+                for child in self.children.get(stack.pop(), ()):
+                    if child not in ids:
+                        ids.add(child)
+                        stack.append(child)
+            self.excluded[id] = ids
+        return ids
+    
+    def find(self, childid, x, y):
+        align = 0
+        parent = "0"
+        excluded = self.subtree(childid)
+        for id, bx, by in self.cells.get((int(x // self.cell), int(y // self.cell)), ()):
+            if id in excluded: continue
+            
+            if by + 11 >= y >= by - 11:
+                if bx - 110 <= x <= bx - 60: 
+                    align = 2
+                    parent = id
+                elif bx + 60 <= x <= bx + 110:
+                    align = 3
+                    parent = id
+            elif bx - 59 <= x <= bx + 59:
+                if by + 11 <= y <= by + 30:
+                    align = 1
+                    parent = id
+                elif by - 11 >= y >= by - 30:
+                    align = 0
+                    parent = id
+        
+        return [parent, align]
 
+_snap_grid = None
+
+@timed('find_parent')
 def find_parent(childid, x, y, w, h, context):
-    align = 0
-    parent = "0"
-    for pin in context.window_manager.pins_data:
-        if pin.preset != active_preset_id(context): continue
-        if pin.id == childid: continue
-        if pin.parent == childid: continue
-        
-        bx = pin.x * w
-        by = pin.y * h
-        
-        if by + 11 >= y >= by - 11:
-            if bx - 110 <= x <= bx - 60: 
-                align = 2
-                parent = pin.id
-            elif bx + 60 <= x <= bx + 110:
-                align = 3
-                parent = pin.id
-        elif bx - 59 <= x <= bx + 59:
-            if by + 11 <= y <= by + 30:
-                align = 1
-                parent = pin.id
-            elif by - 11 >= y >= by - 30:
-                align = 0
-                parent = pin.id
-
-    return [parent, align]
-
-def get_parent_pos(context, id):
-    for pin in context.window_manager.pins_data:
-        if pin.id == id:
-            return [pin.x, pin.y]
-    return [0, 0]
+    global _snap_grid
+    index = pins_index(context)
+    if _snap_grid is None or _snap_grid.key != (index.key, w, h):
+        _snap_grid = SnapGrid(index, pins_layout(context, index), w, h)
+    return _snap_grid.find(childid, x, y)
+
+ALIGN_OFFSETS = ((0, -24), (0, 24), (-123, 0), (123, 0)) #bottom, up, left, right
+
+LAYOUT_SET = 1
+LAYOUT_CHILD = 2
+
+FAILED_FLASH = 0.25
+
+class PinState:
+    __slots__ = ('id', 'label', 'type', 'mode', 'failed')
+    
+    def __init__(self, id):
+        self.id = id
+        self.failed = 0.0
+    
+    def sync(self, pin):
+        text = pin.text
+        if len(text) > 16:
+            self.label = '%s..%s' % (text[:8], text[-8:])
+        elif len(text) > 14:
+            self.label = '%s..' % text[:15]
+        else:
+            self.label = text
+        self.type = pin.type
+        self.mode = pin.mode if pin.type == 0 and not pin.call.startswith('INFO') else None
+
+class PinsLayout:
+    dtypes = {'f': 'float32', 'd': 'float64', 'i': 'int32', 'B': 'uint8'}
+    
+    def __init__(self):
+        self.key = None
+        self.active = []
+        self.levels = []
+        self.nested = []
+        self.loose = []
+        self.states = []
+        self.by_id = {}
+        self.children = {}
+        self.sizes = {}
+        self.size = None
+        self.dirty = set()
+        self.modes = {}
+        self.version = 0
+        self.flashing = set()
+        self.drawn_key = None
+        self.drawn = []
+        self.culled = 0
+        self.hidden = 0
+        self.dx = [dx for dx, dy in ALIGN_OFFSETS]
+        self.dy = [dy for dx, dy in ALIGN_OFFSETS]
+        if numpy is not None:
+            self.dx = numpy.array(self.dx, dtype='float64')
+            self.dy = numpy.array(self.dy, dtype='float64')
+    
+    def column(self, typecode, n, value=0):
+        if numpy is not None:
+            return numpy.full(n, value, dtype=self.dtypes[typecode])
+        return array(typecode, [value]) * n
+    
+    def rebuild(self, wm, index):
+        pins = wm.pins_data
+        n = len(pins)
+        self.key = index.key
+        self.x = self.column('f', n)
+        self.y = self.column('f', n)
+        self.align = self.column('i', n)
+        self.flags = self.column('B', n)
+        self.parent = self.column('i', n, -1)
+        pins.foreach_get('x', self.x)
+        pins.foreach_get('y', self.y)
+        pins.foreach_get('align', self.align)
+        pins.foreach_get('set', self.flags)
+        self.active = index.active
+        self.loose = []
+        self.states = [None] * n
+        states = {}
+        for i in index.active:
+            pin = pins[i]
+            if not self.flags[i] & LAYOUT_SET:
+                self.loose.append(i)
+            if pin.parent != "0":
+                self.parent[i] = index.by_id.get(pin.parent, -1)
+            state = self.by_id.get(pin.id) or PinState(pin.id)
+            state.sync(pin)
+            self.states[i] = states[pin.id] = state
+        self.by_id = states
+        self.sizes = {}
+        self.size = None
+        self.dirty = set()
+        self.modes = {}
+        self.version += 1
+        self.sort()
+    
+    def sort(self):
+        active = set(self.active)
+        parent = self.parent
+        depth = {}
+        for i in self.active:
+            if i in depth: continue
+            path = [i]
+            visiting = {i}
+            while True:
+                p = parent[path[-1]]
+                if p < 0 or p not in active or p in depth:
+                    break
+                if p in visiting: #break the cycle at its last link
+                    parent[path[-1]] = -1
+                    break
+                path.append(p)
+                visiting.add(p)
+            p = parent[path[-1]]
+            d = depth[p] + 1 if p in depth else 0
+            for j in reversed(path):
+                depth[j] = d
+                d += 1
+        levels = []
+        self.children = {}
+        for i in self.active:
+            d = depth[i]
+            self.flags[i] = self.flags[i] & LAYOUT_SET | (LAYOUT_CHILD if d else 0)
+            if not d: continue
+            while len(levels) < d:
+                levels.append([])
+            levels[d - 1].append(i)
+            self.children.setdefault(int(parent[i]), []).append(i)
+        self.nested = [i for level in levels for i in level]
+        if numpy is not None:
+            levels = [numpy.array(level, dtype='int32') for level in levels]
+        self.levels = levels
+    
+    def parent_id(self, i):
+        p = self.parent[i]
+        if p < 0:
+            return "0"
+        return self.states[p] and self.states[p].id
+    
+    def fail(self, id):
+        state = self.by_id.get(id)
+        if state is not None:
+            state.failed = perf_counter()
+            self.flashing.add(id)
+    
+    def failing(self, index, now):
+        rows = set()
+        for id in list(self.flashing):
+            state = self.by_id.get(id)
+            if state is not None and now - state.failed < FAILED_FLASH:
+                rows.add(index.by_id[id])
+            else:
+                if state is not None:
+                    state.failed = 0.0
+                self.flashing.discard(id)
+        return rows
+    
+    def subtree(self, rows):
+        nodes = set()
+        stack = list(rows)
+        while stack:
+            i = stack.pop()
+            if i not in nodes:
+                nodes.add(i)
+                stack.extend(self.children.get(i, ()))
+        return nodes
+    
+    def commit(self, wm, i):
+        pins = wm.pins_data
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            pin = pins[j]
+            parent = self.parent_id(j) or pin.parent
+            if pin.parent != parent:
+                pin.parent = parent
+            if pin.align != self.align[j]:
+                pin.align = int(self.align[j])
+            if pin.x != self.x[j] or pin.y != self.y[j]:
+                pin.x = float(self.x[j])
+                pin.y = float(self.y[j])
+            stack.extend(self.children.get(j, ()))
+    
+    def invalidate(self, i):
+        self.dirty.add(i)
+        self.sizes = {self.size: self.sizes[self.size]} if self.size in self.sizes else {}
     
+    def move(self, i, x, y, parent, align):
+        moved = False
+        if parent < 0:
+            old = (self.x[i], self.y[i])
+            self.x[i] = x
+            self.y[i] = y
+            moved = (self.x[i], self.y[i]) != old
+        if parent != self.parent[i] or align != self.align[i]:
+            self.parent[i] = parent
+            self.align[i] = align
+            self.sort()
+            self.invalidate(i)
+        elif moved:
+            self.invalidate(i)
+        return moved
+    
+    def place(self, w, h):
+        n = len(self.x)
+        px = self.column('d', n)
+        py = self.column('d', n)
+        parents, aligns = self.parent, self.align
+        if numpy is not None:
+            px[:] = self.x * w
+            py[:] = self.y * h
+            for level in self.levels:
+                align = aligns[level]
+                px[level] = px[parents[level]] + self.dx[align]
+                py[level] = py[parents[level]] + self.dy[align]
+            return px, py
+        for i in range(n):
+            px[i] = self.x[i] * w
+            py[i] = self.y[i] * h
+        for level in self.levels:
+            for i in level:
+                px[i] = px[parents[i]] + self.dx[aligns[i]]
+                py[i] = py[parents[i]] + self.dy[aligns[i]]
+        return px, py
+    
+    def update(self, w, h):
+        px, py = self.px, self.py
+        stack = list(self.dirty)
+        nodes = []
+        while stack:
+            i = stack.pop()
+            if self.flags[i] & LAYOUT_CHILD:
+                p = self.parent[i]
+                px[i] = px[p] + self.dx[self.align[i]]
+                py[i] = py[p] + self.dy[self.align[i]]
+                nodes.append(i)
+            else:
+                px[i] = self.x[i] * w
+                py[i] = self.y[i] * h
+            stack.extend(self.children.get(i, ()))
+        self.dirty = set()
+        return nodes
+    
+    def normalise(self, nodes, w, h):
+        if numpy is not None:
+            nodes = numpy.asarray(nodes, dtype='int32')
+            x = (self.px[nodes] / w).astype('float32')
+            y = (self.py[nodes] / h).astype('float32')
+            changed = nodes[(x != self.x[nodes]) | (y != self.y[nodes])].tolist()
+            self.x[nodes] = x
+            self.y[nodes] = y
+            return changed
+        changed = []
+        xs, ys, px, py = self.x, self.y, self.px, self.py
+        for i in nodes:
+            old = (xs[i], ys[i])
+            xs[i] = px[i] / w
+            ys[i] = py[i] / h
+            if (xs[i], ys[i]) != old:
+                changed.append(i)
+        return changed
+    
+    def resolve(self, w, h):
+        if self.size != (w, h):
+            if self.dirty:
+                self.sizes = {}
+                self.dirty = set()
+            self.size = (w, h)
+            if self.size not in self.sizes:
+                self.sizes[self.size] = self.place(w, h)
+            self.px, self.py = self.sizes[self.size]
+            self.version += 1
+            return self.normalise(self.nested, w, h)
+        if not self.dirty:
+            return []
+        self.version += 1
+        return self.normalise(self.update(w, h), w, h)
+    
+    def visible(self, mode):
+        rows = self.modes.get(mode)
+        if rows is None:
+            states = self.states
+            rows = self.modes[mode] = [i for i in self.active if states[i].mode is None or states[i].mode == mode]
+        return rows
+    
+    def shown(self, mode, w, h):
+        key = (mode, w, h, self.version)
+        if self.drawn_key != key:
+            rows = self.visible(mode)
+            px, py = self.px, self.py
+            if numpy is not None and rows:
+                rows = numpy.asarray(rows, dtype='int32')
+                x = px[rows]
+                y = py[rows]
+                self.drawn = rows[(x >= -60) & (x <= w + 60) & (y >= -11) & (y <= h + 11)].tolist()
+            else:
+                self.drawn = [i for i in rows if -60 <= px[i] <= w + 60 and -11 <= py[i] <= h + 11]
+            self.culled = len(rows) - len(self.drawn)
+            self.hidden = len(self.active) - len(rows)
+            self.drawn_key = key
+        return self.drawn
+
+_pins_layout = PinsLayout()
+
+def pins_layout(context, index):
+    if _pins_layout.key != index.key:
+        _pins_layout.rebuild(context.window_manager, index)
+    return _pins_layout
+    
+@timed('draw_callback_px')
 def draw_callback_px(self, context):
     if context.area.type != 'VIEW_3D': return
     if context.region.id != VIEW3D_OT_pins._region_id: return
     
-    wm = context.window_manager
+    w = context.region.width
+    h = context.region.height
     x = self.cursor[0]
     y = self.cursor[1]
+    index = pins_index(context)
+    layout = pins_layout(context, index)
+    style = _pins_style.resolve(context)
+    overlay = _pins_overlay
+    states = layout.states
+    self.dragging = bool(layout.loose)
     
-    for i, pin in enumerate(wm.pins_data):
-        if pin.preset != active_preset_id(context): continue
-        
-        if not pin.set:
-            pin.x = x / context.region.width
-            pin.y = y / context.region.height
-            
-            parent = find_parent(pin.id, x, y, context.region.width, context.region.height, context)
-            pin.parent = parent[0]
-            pin.align = parent[1]
-            
-        if pin.parent != "0":
-            pos = get_parent_pos(context, pin.parent)
-            if pin.align == 0: #bottom
-                drawx = pos[0] * context.region.width
-                drawy = pos[1] * context.region.height - 24
-            elif pin.align == 1: #up
-                drawx = pos[0] * context.region.width
-                drawy = pos[1] * context.region.height + 24
-            elif pin.align == 2: #left
-                drawx = pos[0] * context.region.width - 123
-                drawy = pos[1] * context.region.height
-            elif pin.align == 3: #right
-                drawx = pos[0] * context.region.width + 123
-                drawy = pos[1] * context.region.height
-            pin.x = drawx / context.region.width
-            pin.y = drawy / context.region.height
-        
-        if pin.type == 0:
-            if not pin.call.startswith('INFO'):
-                if pin.mode != context.mode: continue
-        
-        bx = pin.x * context.region.width
-        by = pin.y * context.region.height
-        
-        length = len(pin.text)
-        if length > 16:
-            display_text = '%s..%s' % (pin.text[:8], pin.text[-8:])
-        elif length > 14:
-            display_text = '%s..' % pin.text[:15]
-        else:
-            display_text = pin.text
-            
-        if(draw_pin(display_text, x, y, bx, by, 120, 22, pin.type, pin.failed)):
-            self.hover = i
-        pin.failed = False
+    for i in layout.loose:
+        parent = find_parent(states[i].id, x, y, w, h, context)
+        layout.move(i, x / w, y / h, index.by_id.get(parent[0], -1), parent[1])
+    
+    layout.resolve(w, h)
+    rows = layout.shown(context.mode, w, h)
+    dragged = layout.subtree(layout.loose)
+    failing = layout.failing(index, perf_counter())
+    if failing:
+        self.redraw.dirty = True
+    
+    overlay.prepare((w, h, index.key, context.mode, tuple(sorted(dragged))), layout, rows, dragged)
+    live = set(overlay.hits.covering(x, y))
+    live.update(i for i in failing if i in overlay.rows)
+    
+    if overlay.validate(PinsOverlay.cache_key(w, h, index.key, style, context.mode, dragged, live)):
+        batch = PinBatch()
+        for i in overlay.rows:
+            if i in live: continue
+            batch.add(states[i].label, -1e9, -1e9, layout.px[i], layout.py[i], 120, 22, states[i].type, False, style)
+        overlay.render(batch, w, h)
+    overlay.blit(w, h)
+    
+    batch = PinBatch()
+    boxes = []
+    for i in sorted(live):
+        batch.add(states[i].label, x, y, layout.px[i], layout.py[i], 120, 22, states[i].type, i in failing, style)
+    if dragged:
+        for i in rows:
+            if i not in dragged: continue
+            bx = layout.px[i]
+            by = layout.py[i]
+            batch.add(states[i].label, x, y, bx, by, 120, 22, states[i].type, i in failing, style)
+            boxes.append((bx - 60, by - 11, bx + 60, by + 11, i))
+    if batch.texts:
+        draw_batch(batch)
+    
+    _pins_style.count(len(overlay.rows) + len(boxes))
+    self.hits = HoverIndex(overlay.boxes + boxes, index.key) if boxes else overlay.hits
+
+class HoverIndex:
+    def __init__(self, boxes, key=None):
+        self.key = key
+        self.width = 0
+        order = sorted(range(len(boxes)), key=lambda n: boxes[n][0])
+        self.x1 = [boxes[n][0] for n in order]
+        self.boxes = [boxes[n] + (n,) for n in order]
+        for x1, y1, x2, y2, i in boxes:
+            self.width = max(self.width, x2 - x1)
+    
+    def find(self, x, y):
+        hover = -1
+        top = -1
+        for n in range(bisect_left(self.x1, x - self.width), bisect_right(self.x1, x)):
+            x1, y1, x2, y2, i, drawn = self.boxes[n]
+            if x <= x2 and y1 <= y <= y2 and drawn > top:
+                hover = i
+                top = drawn
+        return hover
+
+    def covering(self, x, y):
+        hits = []
+        for n in range(bisect_left(self.x1, x - self.width), bisect_right(self.x1, x)):
+            x1, y1, x2, y2, i, drawn = self.boxes[n]
+            if x <= x2 and y1 <= y <= y2:
+                hits.append(i)
+        return hits
+
+class PinsOverlay:
+    def __init__(self):
+        self.base = None
+        self.key = None
+        self.rows = []
+        self.boxes = []
+        self.hits = HoverIndex([])
+        self.batch = None
+        self.offscreen = None
+        self.renders = 0
+    
+    @staticmethod
+    def cache_key(w, h, generation, style, mode, dragged, live):
+        return (w, h, generation, style, mode, tuple(sorted(dragged)), tuple(sorted(live)))
+    
+    def prepare(self, base, layout, rows, dragged):
+        if base == self.base: return
+        self.base = base
+        self.rows = [i for i in rows if i not in dragged]
+        self.boxes = [(layout.px[i] - 60, layout.py[i] - 11, layout.px[i] + 60, layout.py[i] + 11, i) for i in self.rows]
+        self.hits = HoverIndex(self.boxes, base[2])
+    
+    def validate(self, key):
+        if key == self.key:
+            return False
+        self.key = key
+        return True
+    
+    def invalidate(self):
+        self.base = None
+        self.key = None
+    
+    def render(self, batch, w, h):
+        self.renders += 1
+        self.batch = batch
+        if gpu is None or not batch.texts:
+            return
+        try:
+            if self.offscreen is None or (self.offscreen.width, self.offscreen.height) != (w, h):
+                self.free()
+                self.offscreen = gpu.offscreen.new(w, h)
+        except Exception:
+            return
+        self.offscreen.bind(True)
+        try:
+            bgl.glClearColor(0.0, 0.0, 0.0, 0.0)
+            bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
+            bgl.glColorMask(True, True, True, False)
+            draw_batch(batch)
+            bgl.glColorMask(False, False, False, True) #accumulate alpha so the buffer is premultiplied
+            bgl.glBlendFunc(bgl.GL_ONE, bgl.GL_ONE_MINUS_SRC_ALPHA)
+            draw_batch(batch)
+        finally:
+            bgl.glColorMask(True, True, True, True)
+            bgl.glBlendFunc(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
+            self.offscreen.unbind(True)
+        self.batch = None
+    
+    def blit(self, w, h):
+        if self.batch is not None:
+            if self.batch.texts:
+                draw_batch(self.batch)
+            return
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glBlendFunc(bgl.GL_ONE, bgl.GL_ONE_MINUS_SRC_ALPHA)
+        bgl.glEnable(bgl.GL_TEXTURE_2D)
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, self.offscreen.color_texture)
+        bgl.glColor4f(1.0, 1.0, 1.0, 1.0)
+        bgl.glBegin(bgl.GL_QUADS)
+        for u, v in ((0, 0), (1, 0), (1, 1), (0, 1)):
+            bgl.glTexCoord2f(u, v)
+            bgl.glVertex2f(u * w, v * h)
+        bgl.glEnd()
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+        bgl.glDisable(bgl.GL_TEXTURE_2D)
+        bgl.glBlendFunc(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
+    
+    def free(self):
+        if self.offscreen is not None:
+            self.offscreen.free()
+            self.offscreen = None
+        self.invalidate()
+
+_pins_overlay = PinsOverlay()
+
+class RedrawScheduler:
+    def __init__(self):
+        self.state = None
+        self.dirty = True
+        self.events = 0
+        self.requests = 0
+    
+    def update(self, state):
+        self.events += 1
+        if not self.dirty and state == self.state:
+            return False
+        self.state = state
+        self.dirty = False
+        self.requests += 1
+        if PinsStats.enabled:
+            _pins_stats.count('redraw_requests')
+        return True
     
 class VIEW3D_OT_pins(bpy.types.Operator):
     bl_idname = "view3d.pins"
@@ -260,38 +1529,70 @@ class VIEW3D_OT_pins(bpy.types.Operator):
     
     _handle = None
     _region_id = None
+    _timer = None
     
     @staticmethod
     def handle_add(self, context):
         self.cursor = [0, 0]
         self.hover = -1
+        self.hits = HoverIndex([])
+        self.dragging = False
+        self.redraw = RedrawScheduler()
         VIEW3D_OT_pins._region_id = context.region.id
         VIEW3D_OT_pins._handle = bpy.types.SpaceView3D.draw_handler_add(draw_callback_px, (self, context), 'WINDOW', 'POST_PIXEL')
+        VIEW3D_OT_pins._timer = context.window_manager.event_timer_add(0.1, context.window)
         
     @staticmethod
     def handle_remove(context):
         if VIEW3D_OT_pins._handle is not None:
             bpy.types.SpaceView3D.draw_handler_remove(VIEW3D_OT_pins._handle, 'WINDOW')
+        if VIEW3D_OT_pins._timer is not None:
+            context.window_manager.event_timer_remove(VIEW3D_OT_pins._timer)
         VIEW3D_OT_pins._handle = None
         VIEW3D_OT_pins._region_id = None
+        VIEW3D_OT_pins._timer = None
+        _pins_overlay.free()
     
-    def modal(self, context, event):
-        if context.area:
+    def tag_redraw(self, context):
+        wm = context.window_manager
+        state = (self.hover, self.dragging and tuple(self.cursor), PinsIndex.generation, wm.pins_presets_active_index, wm.pins_opacity, context.mode)
+        if context.area and self.redraw.update(state):
             context.area.tag_redraw()
-
+    
+    def modal(self, context, event):
+        if not PinsStats.enabled:
+            return self.handle_event(context, event)
+        start = perf_counter()
+        try:
+            return self.handle_event(context, event)
+        finally:
+            _pins_stats.add('modal', perf_counter() - start)
+    
+    def handle_event(self, context, event):
         if event.type == 'MOUSEMOVE':
             self.cursor = [event.mouse_region_x, event.mouse_region_y]
         
         wm = context.window_manager
+        self.hover = -1
+        if self.hits.key == pins_index(context).key:
+            self.hover = self.hits.find(event.mouse_region_x, event.mouse_region_y)
+        self.tag_redraw(context)
+        _pins_journal.poll()
         
-        if self.hover != -1:
+        if event.type == 'TIMER' and len(_macro_queue):
+            self.run_macros(context)
+        
+        if 0 <= self.hover < len(wm.pins_data):
             id = self.hover
-            self.hover = -1
             if event.type == 'RIGHTMOUSE':
                 if event.value == 'PRESS':
-                    wm.pins_data[id].set = not wm.pins_data[id].set
-                    if wm.pins_data[id].set:
-                        save_pins(context)
+                    pin = wm.pins_data[id]
+                    pin.set = not pin.set
+                    if pin.set:
+                        pins_layout(context, pins_index(context)).commit(wm, id)
+                        journal_pins(context, 'pin', pin_record(pin))
+                    touch_pins()
+                    self.tag_redraw(context)
                 return {'RUNNING_MODAL'}
             if event.type == 'LEFTMOUSE':
                 if event.value == 'RELEASE':
@@ -299,13 +1600,20 @@ class VIEW3D_OT_pins(bpy.types.Operator):
                     if pin.set:
                         if pin.type == 0: #Menu
                             bpy.ops.wm.call_menu(name=pin.call)
+                        elif pin.type == 2: #Macro
+                            try:
+                                _macro_queue.push(pin, compile_macro(pin.op))
+                            except:
+                                _pin_calls.pop(pin.op, None)
+                                self.pin_failed(context, pin.id)
                         else:
                             try:
-                                result = eval(pin.call)
+                                result = run_pin_call(pin.op or pin.call)
                                 if result not in [{'FINISHED'}, {'RUNNING_MODAL'}]:
-                                    pin.failed = True
+                                    self.pin_failed(context, pin.id)
                             except:
-                                pin.failed = True
+                                _pin_calls.pop(pin.op or pin.call, None)
+                                self.pin_failed(context, pin.id)
                 return {'RUNNING_MODAL'}
         
         if not context.window_manager.pins_enabled:
@@ -314,6 +1622,22 @@ class VIEW3D_OT_pins(bpy.types.Operator):
         
         return {'PASS_THROUGH'}
     
+    def pin_failed(self, context, id):
+        _pins_layout.fail(id)
+        self.redraw.dirty = True
+        self.tag_redraw(context)
+    
+    def run_macros(self, context):
+        for id in _macro_queue.run():
+            _pins_layout.fail(id)
+            self.redraw.dirty = True
+        if context.area:
+            if len(_macro_queue):
+                context.area.header_text_set(_macro_queue.status())
+            else:
+                context.area.header_text_set()
+        self.tag_redraw(context)
+    
     def cancel(self, context):
         if context.window_manager.pins_enabled:
             VIEW3D_OT_pins.handle_remove(context)
@@ -336,40 +1660,169 @@ class VIEW3D_OT_pins(bpy.types.Operator):
             self.report({'WARNING'}, "No 3D Views were found, cannot run pins.")
             return {'CANCELLED'}
 
-def build_operator(op):
-    op_dir = "bpy.ops.%s" % (".".join(op.bl_idname.lower().split("_ot_", 1)))
-    op_args = "("
-    
-    for i, k in enumerate(op.properties.keys()):
-        if hasattr(op.properties, k):
-            if i != 0: op_args += ", "
-            attr = getattr(op.properties, k)
-            if isinstance(attr, str):
-                op_args += "%s='%s'" % (k, attr)
-            elif isinstance(attr,(type(None),int,float,bool)):
-                op_args += "%s=%s" % (k, attr)
-            else:
-                if hasattr(bpy.types, k) is False:
-                    op_args += "%s=%s" % (k, tuple(attr))
-                else:
-                    op_args += "%s={" % k
-                    for ni, nk in enumerate(attr.bl_rna.properties.keys()):
-                        if hasattr(attr, nk):
-                            if nk == 'rna_type': continue
-                            if ni > 1: op_args += ", "
-                            nattr = getattr(attr, nk)
-                            if isinstance(nattr, str):
-                                value = "'%s'" % nattr
-                            elif isinstance(nattr, (type(None),int,float,bool)):
-                                value = str(nattr)
-                            else:
-                                value = str(tuple(nattr))
-                            op_args += "\"%s\":%s" % (nk, value)
-                    op_args += "}"
-                    
-    op_args += ")"
-    return "%s%s" % (op_dir, op_args)
-            
+_pin_calls = {}
+
+def parse_pin_call(call):
+    try:
+        node = ast.parse(call, mode='eval').body
+    except SyntaxError:
+        raise ValueError("Malformed pin call: %s" % call)
+    if not isinstance(node, ast.Call):
+        raise ValueError("Pin call is not an operator call: %s" % call)
+    
+    path = []
+    func = node.func
+    while isinstance(func, ast.Attribute):
+        path.insert(0, func.attr)
+        func = func.value
+    if not isinstance(func, ast.Name) or func.id != 'bpy' or len(path) != 3 or path[0] != 'ops':
+        raise ValueError("Pin call is not a bpy.ops operator: %s" % call)
+    if getattr(node, 'starargs', None) or getattr(node, 'kwargs', None):
+        raise ValueError("Pin call uses unpacked arguments: %s" % call)
+    
+    parsed = {'op': "%s.%s" % (path[1], path[2]), 'context': None, 'undo': None, 'kwargs': {}}
+    try:
+        args = [ast.literal_eval(arg) for arg in node.args]
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise ValueError
+            parsed['kwargs'][keyword.arg] = ast.literal_eval(keyword.value)
+    except ValueError:
+        raise ValueError("Pin call arguments must be literals: %s" % call)
+    
+    for arg in args:
+        if isinstance(arg, bool) and parsed['undo'] is None:
+            parsed['undo'] = arg
+        elif isinstance(arg, str) and parsed['context'] is None and parsed['undo'] is None:
+            parsed['context'] = arg
+        else:
+            raise ValueError("Unexpected positional argument %r in pin call: %s" % (arg, call))
+    return parsed
+
+def compile_pin_call(call):
+    compiled = _pin_calls.get(call)
+    if compiled is None:
+        if call.startswith('{'):
+            parsed = json.loads(call)
+        else:
+            parsed = parse_pin_call(call)
+        category, name = parsed['op'].split('.')
+        op = getattr(getattr(bpy.ops, category), name)
+        if not hasattr(bpy.types, op.idname()):
+            raise ValueError("Unknown operator: %s" % parsed['op'])
+        args = tuple(arg for arg in (parsed['context'], parsed['undo']) if arg is not None)
+        kwargs = dict(parsed['kwargs'])
+        for k in parsed.get('sets', ()):
+            kwargs[k] = set(kwargs[k])
+        compiled = _pin_calls[call] = (op, args, kwargs)
+    return compiled
+
+@timed('run_pin_call')
+def run_pin_call(call):
+    op, args, kwargs = compile_pin_call(call)
+    return op(*args, **kwargs)
+
+def compile_macro(macro):
+    compiled = _pin_calls.get(macro)
+    if compiled is None:
+        steps = json.loads(macro)
+        if not isinstance(steps, list) or not steps:
+            raise ValueError("Macro pin has no steps")
+        compiled = _pin_calls[macro] = [compile_pin_call(json.dumps(step, sort_keys=True)) for step in steps]
+    return compiled
+
+class MacroQueue:
+    budget = 0.02
+    
+    def __init__(self):
+        self.jobs = deque()
+    
+    def __len__(self):
+        return len(self.jobs)
+    
+    def push(self, pin, steps):
+        self.jobs.append([pin.id, pin.text, steps, 0])
+    
+    def status(self):
+        id, text, steps, done = self.jobs[0]
+        status = "Pins macro %s: step %i of %i" % (text, done + 1, len(steps))
+        if len(self.jobs) > 1:
+            status += " (%i queued)" % (len(self.jobs) - 1)
+        return status
+    
+    @timed('run_macros')
+    def run(self):
+        failed = []
+        start = perf_counter()
+        while self.jobs and perf_counter() - start < self.budget:
+            job = self.jobs[0]
+            id, text, steps, done = job
+            op, args, kwargs = steps[done]
+            try:
+                ok = op(*args, **kwargs) == {'FINISHED'}
+            except Exception:
+                ok = False
+            if ok:
+                job[3] = done = done + 1
+                if done < len(steps): continue
+            self.jobs.popleft()
+            if done:
+                bpy.ops.ed.undo_push(message="Pins: %s" % text)
+            if not ok:
+                failed.append(id)
+        return failed
+
+_macro_queue = MacroQueue()
+
+_operator_schemas = {}
+
+def property_schema(op, props, k):
+    schema = _operator_schemas.setdefault(op.bl_idname, {})
+    entry = schema.get(k)
+    if entry is None:
+        prop = props.bl_rna.properties.get(k)
+        if prop is None or prop.identifier == 'rna_type':
+            entry = (None, None)
+        elif prop.type == 'POINTER':
+            nested = getattr(props, k).bl_rna.properties.keys()
+            entry = (prop.type, tuple(nk for nk in nested if nk != 'rna_type'))
+        else:
+            entry = (prop.type, None)
+        schema[k] = entry
+    return entry
+
+def capture_value(value):
+    if isinstance(value, (type(None), str, int, float, bool)):
+        return value
+    if isinstance(value, set):
+        return sorted(value)
+    return [capture_value(v) for v in value]
+
+def capture_operator(op):
+    record = {'op': ".".join(op.bl_idname.lower().split("_ot_", 1)), 'context': None, 'undo': None, 'kwargs': {}, 'sets': []}
+    props = op.properties
+    for k in props.keys():
+        kind, nested = property_schema(op, props, k)
+        if kind is None or not hasattr(props, k):
+            continue
+        attr = getattr(props, k)
+        if nested is not None:
+            record['kwargs'][k] = {nk: capture_value(getattr(attr, nk)) for nk in nested if hasattr(attr, nk)}
+        else:
+            record['kwargs'][k] = capture_value(attr)
+            if isinstance(attr, set):
+                record['sets'].append(k)
+    return record
+
+def render_operator(record):
+    args = [repr(arg) for arg in (record['context'], record['undo']) if arg is not None]
+    for k in sorted(record['kwargs']):
+        value = record['kwargs'][k]
+        if k in record.get('sets', ()):
+            value = set(value)
+        args.append("%s=%r" % (k, value))
+    return "bpy.ops.%s(%s)" % (record['op'], ", ".join(args))
+
 class VIEW3D_OT_pins_add_operator(bpy.types.Operator):
     bl_idname = "view3d.pins_add_operator"
     bl_label = "Add operator pin"
@@ -378,6 +1831,7 @@ class VIEW3D_OT_pins_add_operator(bpy.types.Operator):
     text = StringProperty("Pin Text", default="Pin")
     last_op_id = IntProperty("Last operator ID", default = -1)
     with_pars = BoolProperty("With parameters", default=True)
+    idname = StringProperty("Operator idname", default="", options={'SKIP_SAVE'})
     
     def execute(self, context):
         if not context.window_manager.pins_enabled:
@@ -388,28 +1842,191 @@ class VIEW3D_OT_pins_add_operator(bpy.types.Operator):
         if not len(wm.pins_presets):
             bpy.ops.view3d.pins_preset_add('INVOKE_DEFAULT')
         
+        if self.idname:
+            record = {'op': self.idname, 'context': None, 'undo': None, 'kwargs': {}, 'sets': []}
+        else:
+            record = capture_operator(wm.operators[self.last_op_id])
+        record['undo'] = True
+        if not self.with_pars or self.idname:
+            record['context'] = 'INVOKE_DEFAULT'
+            record['kwargs'] = {}
+            record['sets'] = []
+        op_record = json.dumps(record, sort_keys=True)
+        
+        try:
+            compile_pin_call(op_record)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        
         new_pin = wm.pins_data.add()
         new_pin.id = "%s%i" % (str(time()).replace('.',''), randint(0, 1000))
         new_pin.text = self.text
         new_pin.type = 1
+        new_pin.op = op_record
+        new_pin.call = render_operator(record)
+        print(new_pin.call)
+        new_pin.preset = active_preset_id(context)
         
-        op_func = build_operator(wm.operators[self.last_op_id])
-        if self.with_pars:
-            if op_func.endswith("()"):
-                op_func = op_func.replace("()", "(True)")
-            else:
-                op_func = op_func.replace("(", "(True, ", 1)
-        else:
-            op_func = op_func[:op_func.find("(")]
-            op_func += "('INVOKE_DEFAULT', True)"
+        touch_pins()
+        journal_pins(context, 'pin', pin_record(new_pin))
+        return {'FINISHED'}
+    
+class VIEW3D_OT_pins_add_macro(bpy.types.Operator):
+    bl_idname = "view3d.pins_add_macro"
+    bl_label = "Add macro pin"
+    bl_description = "Adds a pin that runs the last used operators in order as one undo step"
+
+    text = StringProperty("Pin Text", default="Macro")
+    steps = IntProperty("Steps", default=2, min=2, max=32)
+    
+    def execute(self, context):
+        wm = context.window_manager
+        if len(wm.operators) < self.steps:
+            self.report({'ERROR'}, "Not enough operators in history")
+            return {'CANCELLED'}
         
-        print(op_func)
-        new_pin.call = op_func
+        if not wm.pins_enabled:
+            bpy.ops.view3d.pins('INVOKE_DEFAULT')
+        
+        if not len(wm.pins_presets):
+            bpy.ops.view3d.pins_preset_add('INVOKE_DEFAULT')
+        
+        records = []
+        for i in range(len(wm.operators) - self.steps, len(wm.operators)):
+            record = capture_operator(wm.operators[i])
+            record['context'] = 'EXEC_DEFAULT'
+            record['undo'] = False
+            records.append(record)
+        macro = json.dumps(records, sort_keys=True)
+        
+        try:
+            compile_macro(macro)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        
+        new_pin = wm.pins_data.add()
+        new_pin.id = "%s%i" % (str(time()).replace('.',''), randint(0, 1000))
+        new_pin.text = self.text
+        new_pin.type = 2
+        new_pin.op = macro
+        new_pin.call = "; ".join(render_operator(record) for record in records)
         new_pin.preset = active_preset_id(context)
         
-        save_pins(context)
+        touch_pins()
+        journal_pins(context, 'pin', pin_record(new_pin))
         return {'FINISHED'}
+
+def operator_idname(name):
+    return ".".join(name.lower().split("_ot_", 1))
+
+def rna_label(cls):
+    rna = getattr(cls, 'bl_rna', None)
+    if rna is not None:
+        return rna.name
+    return getattr(cls, 'bl_label', "")
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class OperatorCatalogue:
+    kinds = {'HISTORY': 0, 'MENU': 1, 'OPERATOR': 2}
+    limit = 20
+    
+    def __init__(self):
+        self.entries = []
+        self.free = []
+        self.grams = {}
+        self.prefixes = {}
+        self.history = []
+        self.names = []
+        self.built = False
+        self.version = 0
+        self.last = (None, None)
     
+    def add(self, kind, idname, label):
+        text = ("%s %s" % (idname, label)).lower()
+        id = self.free.pop() if self.free else len(self.entries)
+        if id == len(self.entries):
+            self.entries.append(None)
+        self.entries[id] = (kind, idname, label, text)
+        for gram in trigrams(text):
+            self.grams.setdefault(gram, set()).add(id)
+        for word in text.replace('.', ' ').replace('_', ' ').split():
+            for prefix in (word[:1], word[:2]):
+                self.prefixes.setdefault(prefix, set()).add(id)
+        self.version += 1
+        return id
+    
+    def discard(self, id):
+        text = self.entries[id][3]
+        for gram in trigrams(text):
+            self.grams[gram].discard(id)
+        for word in text.replace('.', ' ').replace('_', ' ').split():
+            for prefix in (word[:1], word[:2]):
+                self.prefixes[prefix].discard(id)
+        self.entries[id] = None
+        self.free.append(id)
+        self.version += 1
+    
+    def build(self):
+        for name in dir(bpy.types):
+            if '_OT_' not in name: continue
+            idname = operator_idname(name)
+            if not idname.startswith('view3d.pins'):
+                self.add('OPERATOR', idname, rna_label(getattr(bpy.types, name)))
+        for menu in _menu_registry.classes():
+            self.add('MENU', getattr(menu, 'bl_idname', menu.__name__), getattr(menu, 'bl_label', ""))
+        self.built = True
+    
+    def sync(self, wm):
+        if not self.built:
+            self.build()
+        names = [(op.bl_idname, op.name) for op in wm.operators]
+        old = self.names
+        if names == old:
+            return
+        shift = next(k for k in range(len(old) + 1) if old[k:] == names[:len(old) - k])
+        for id in self.history[:shift]:
+            self.discard(id)
+        added = [self.add('HISTORY', operator_idname(idname), label) for idname, label in names[len(old) - shift:]]
+        self.history = self.history[shift:] + added
+        self.names = names
+    
+    def find(self, token):
+        if len(token) < 3:
+            return self.prefixes.get(token, set())
+        postings = sorted((self.grams.get(gram, set()) for gram in trigrams(token)), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            found &= posting
+        return {id for id in found if token in self.entries[id][3]}
+    
+    def search(self, wm, query):
+        self.sync(wm)
+        key = (query, self.version)
+        if self.last[0] == key:
+            return self.last[1]
+        tokens = query.lower().split()
+        ids = None
+        for token in tokens:
+            ids = self.find(token) if ids is None else ids & self.find(token)
+            if not ids: break
+        slots = {id: slot for slot, id in enumerate(self.history)}
+        first = tokens[0] if tokens else ""
+        def rank(id):
+            kind, idname, label, text = self.entries[id]
+            return (self.kinds[kind], -slots.get(id, 0), not label.lower().startswith(first), len(label), label)
+        results = []
+        for id in nsmallest(self.limit, ids or (), key=rank):
+            kind, idname, label, text = self.entries[id]
+            results.append((kind, idname, label, slots.get(id, -1)))
+        self.last = (key, results)
+        return results
+
+_operator_catalogue = OperatorCatalogue()
+
 class VIEW3D_PT_pins(bpy.types.Panel):
     bl_idname = "VIEW3D_PT_pins"
     bl_space_type = "VIEW_3D"
@@ -418,9 +2035,19 @@ class VIEW3D_PT_pins(bpy.types.Panel):
     
     bl_label = "Configure"
     
+    def add_button(self, layout, wm, text, icon):
+        props = layout.operator(VIEW3D_OT_pins_add_operator.bl_idname, icon=icon, text=text)
+        if not len(wm.pins_text):
+            props.text = text
+        else:
+            props.text = wm.pins_text
+        props.with_pars = wm.pins_with_pars
+        return props
+    
     def draw(self, context):
         layout = self.layout
         wm = context.window_manager
+        inject_menu_pins()
         
         if wm.pins_enabled is False:
             layout.operator(VIEW3D_OT_pins.bl_idname, 'Show Pins', icon='UNPINNED')
@@ -428,22 +2055,37 @@ class VIEW3D_PT_pins(bpy.types.Panel):
             layout.operator(VIEW3D_OT_pins.bl_idname, 'Hide Pins', icon='PINNED')
         
         layout.prop(wm, 'pins_opacity', text='Opacity')
-
-        if len(wm.operators):
-            layout.label("Name of new pin:")
-            layout.prop(wm, 'pins_text', text="")
-            layout.prop(wm, 'pins_with_pars', text="With parameters")
-            layout.label("Pin last used operators:")
+        
+        layout.label("Name of new pin:")
+        layout.prop(wm, 'pins_text', text="")
+        layout.prop(wm, 'pins_with_pars', text="With parameters")
+        layout.prop(wm, 'pins_search', text="", icon='VIEWZOOM')
+        
+        if wm.pins_search:
             col = layout.column()
             sub = col.column(align=True)
-            for i, op in reversed(list(enumerate(wm.operators))[-5:]):
-                props = sub.operator(VIEW3D_OT_pins_add_operator.bl_idname, icon='PLUS', text=op.name)
-                if not len(wm.pins_text):
-                    props.text = op.name
+            results = _operator_catalogue.search(wm, wm.pins_search)
+            for kind, idname, label, slot in results:
+                if kind == 'MENU':
+                    sub.operator(VIEW3D_OT_pins_toggle_menu.bl_idname, icon='COLLAPSEMENU', text=label or idname).menu = idname
+                elif kind == 'HISTORY':
+                    self.add_button(sub, wm, label, 'RECOVER_LAST').last_op_id = slot
                 else:
-                    props.text = wm.pins_text
-                props.last_op_id = i
-                props.with_pars = context.window_manager.pins_with_pars
+                    self.add_button(sub, wm, label or idname, 'PLUS').idname = idname
+            if not results:
+                sub.label("No matching operators or menus.")
+        elif len(wm.operators):
+            layout.label("Pin last used operators:")
+            col = layout.column()
+            sub = col.column(align=True)
+            for i in range(len(wm.operators) - 1, max(len(wm.operators) - 6, -1), -1):
+                self.add_button(sub, wm, wm.operators[i].name, 'PLUS').last_op_id = i
+            if len(wm.operators) >= 2:
+                row = layout.row(align=True)
+                row.prop(wm, 'pins_macro_steps', text="Steps")
+                props = row.operator(VIEW3D_OT_pins_add_macro.bl_idname, text="Pin as macro", icon='LINKED')
+                props.steps = min(wm.pins_macro_steps, len(wm.operators))
+                props.text = wm.pins_text or "Macro"
         else:
             layout.label("No operator history.")
         
@@ -458,6 +2100,9 @@ class VIEW3D_OT_pins_preset_add(bpy.types.Operator):
         new_preset.name = "New Preset"
         new_preset.id = "%s%i" % (str(time()).replace('.',''), randint(0, 1000))
         wm.pins_presets_active_index = len(wm.pins_presets) - 1
+        _pins_store.sync(context)
+        touch_pins()
+        journal_pins(context, 'preset', preset_record(new_preset))
         save_pins(context)
         return {'FINISHED'}
 
@@ -471,16 +2116,132 @@ class VIEW3D_OT_pins_preset_remove(bpy.types.Operator):
         if not len(wm.pins_presets):
             return {'CANCELLED'}
             
-        for i, pin in reversed(list(enumerate(wm.pins_data))):
-            if pin.preset == active_preset_id(context):
-                wm.pins_data.remove(i)
+        preset_id = active_preset_id(context)
+        _pins_store.drop(context, preset_id)
         
         wm.pins_presets.remove(wm.pins_presets_active_index)
         if wm.pins_presets_active_index >= len(wm.pins_presets):
             wm.pins_presets_active_index = len(wm.pins_presets) - 1
+        _pins_store.sync(context)
+        touch_pins()
+        journal_pins(context, 'unpreset', preset_id)
+        save_pins(context)
+        return {'FINISHED'}
+        
+class VIEW3D_OT_pins_preset_duplicate(bpy.types.Operator):
+    bl_idname = "view3d.pins_preset_duplicate"
+    bl_label = "Duplicate preset"
+    bl_description = "Adds a copy of the active pins preset"
+
+    @classmethod
+    def poll(cls, context):
+        return len(context.window_manager.pins_presets) > 0
+
+    def execute(self, context):
+        wm = context.window_manager
+        source = wm.pins_presets[wm.pins_presets_active_index]
+        source_id = source.id
+        name = "%s Copy" % source.name
+        
+        new_preset = wm.pins_presets.add()
+        new_preset.name = name
+        new_preset.id = "%s%i" % (str(time()).replace('.',''), randint(0, 1000))
+        stamp = str(time()).replace('.','')
+        ids = _pins_store.copy(context, source_id, new_preset.id, stamp)
+        journal_pins(context, 'batch', [
+            ['preset', preset_record(new_preset)],
+            ['copy', {'source': source_id, 'target': new_preset.id, 'ids': ids}]])
+        
+        wm.pins_presets_active_index = len(wm.pins_presets) - 1
+        _pins_store.sync(context)
+        touch_pins()
         save_pins(context)
         return {'FINISHED'}
+
+_pins_preset_items = []
+
+def pins_preset_items(self, context):
+    global _pins_preset_items
+    wm = context.window_manager
+    active = active_preset_id(context)
+    _pins_preset_items = [(preset.id, preset.name, "") for preset in wm.pins_presets if preset.id != active]
+    return _pins_preset_items
+
+class VIEW3D_OT_pins_preset_merge(bpy.types.Operator):
+    bl_idname = "view3d.pins_preset_merge"
+    bl_label = "Merge preset"
+    bl_description = "Moves the pins of the active preset into another preset and removes it"
+
+    target = EnumProperty(name="Into", items=pins_preset_items)
+    
+    @classmethod
+    def poll(cls, context):
+        return len(context.window_manager.pins_presets) > 1
+    
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+    
+    def execute(self, context):
+        wm = context.window_manager
+        source = active_preset_id(context)
+        presets = [preset.id for preset in wm.pins_presets]
+        if self.target == source or self.target not in presets:
+            return {'CANCELLED'}
         
+        _pins_store.merge(context, source, self.target)
+        wm.pins_presets.remove(wm.pins_presets_active_index)
+        wm.pins_presets_active_index = presets.index(self.target) - (presets.index(self.target) > presets.index(source))
+        _pins_store.sync(context)
+        touch_pins()
+        journal_pins(context, 'merge', {'source': source, 'target': self.target})
+        save_pins(context)
+        return {'FINISHED'}
+
+class VIEW3D_OT_pins_export(bpy.types.Operator):
+    bl_idname = "view3d.pins_export"
+    bl_label = "Export pins"
+    bl_description = "Writes pins presets to a JSON Lines library"
+    
+    filepath = StringProperty(subtype='FILE_PATH', default="")
+    filter_glob = StringProperty(default="*.jsonl", options={'HIDDEN'})
+    active_only = BoolProperty("Active preset only", default=False)
+    
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "pins.jsonl"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):
+        presets = [active_preset_id(context)] if self.active_only else None
+        count = export_pins(context, bpy.path.abspath(self.filepath), presets)
+        self.report({'INFO'}, "Exported %i pin(s) to %s" % (count, self.filepath))
+        return {'FINISHED'}
+
+class VIEW3D_OT_pins_import(bpy.types.Operator):
+    bl_idname = "view3d.pins_import"
+    bl_label = "Import pins"
+    bl_description = "Adds the presets and pins of a JSON Lines library"
+    
+    filepath = StringProperty(subtype='FILE_PATH', default="")
+    filter_glob = StringProperty(default="*.jsonl", options={'HIDDEN'})
+    
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):
+        try:
+            count = import_pins(context, bpy.path.abspath(self.filepath))
+        except (OSError, ValueError, TypeError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        
+        if not context.window_manager.pins_enabled:
+            bpy.ops.view3d.pins('INVOKE_DEFAULT')
+        self.report({'INFO'}, "Imported %i pin(s) from %s" % (count, self.filepath))
+        return {'FINISHED'}
+
 class PINS_UL_presets(bpy.types.UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
@@ -505,9 +2266,15 @@ class VIEW3D_PT_pins_presets(bpy.types.Panel):
         col = row.column(align=True)
         col.operator(VIEW3D_OT_pins_preset_add.bl_idname, text="", icon="ZOOMIN")
         col.operator(VIEW3D_OT_pins_preset_remove.bl_idname, text="", icon="ZOOMOUT")
+        col.separator()
+        col.operator(VIEW3D_OT_pins_preset_duplicate.bl_idname, text="", icon="COPYDOWN")
+        col.operator(VIEW3D_OT_pins_preset_merge.bl_idname, text="", icon="AUTOMERGE_ON")
         if wm.pins_presets_active_index >= 0 and wm.pins_presets_active_index < len(wm.pins_presets):
             col.separator()
             col.operator(VIEW3D_OT_pins_preset_hotkey.bl_idname, text="", icon="LINK").id = wm.pins_presets_active_index
+        row = layout.row(align=True)
+        row.operator(VIEW3D_OT_pins_import.bl_idname, text="Import", icon="IMPORT")
+        row.operator(VIEW3D_OT_pins_export.bl_idname, text="Export", icon="EXPORT")
 
 class VIEW3D_OT_pins_preset_hotkey(bpy.types.Operator):
     bl_idname = "view3d.pins_preset_hotkey"
@@ -527,23 +2294,32 @@ class VIEW3D_OT_pins_preset_hotkey(bpy.types.Operator):
         wm.pins_presets_active_index = self.id
         return {'FINISHED'}
         
+def pins_preset_name_update(self, context):
+    if self.id != "0":
+        journal_pins(context, 'preset', preset_record(self))
+
 class PinsPresetItem(bpy.types.PropertyGroup):
-    name = StringProperty(name="Preset name", default="Unknown")
+    name = StringProperty(name="Preset name", default="Unknown", update=pins_preset_name_update)
     id = StringProperty(name="Preset id", default="0")
 
+def pins_text_update(self, context):
+    touch_pins()
+    if not PinsTable.filling and self.preset != "0":
+        journal_pins(context, 'pin', pin_record(self))
+
 class PinsItem(bpy.types.PropertyGroup):
     id = StringProperty(name="Pin id", default="0")
     preset = StringProperty(name="Preset id", default="0")
-    text = StringProperty(name="Pin text", default="Pin")
+    text = StringProperty(name="Pin text", default="Pin", update=pins_text_update)
     mode = StringProperty(name="Pin context mode", default="")
     type = IntProperty(name="Pin type", default=0)
     call = StringProperty(name="Pin menu id", default="")
+    op = StringProperty(name="Pin operator record", default="")
     x = FloatProperty(name="Position X", default=0.0)
     y = FloatProperty(name="Position Y", default=0.0)
     set = BoolProperty(name="Pin set", default=False)
     parent = StringProperty(name="Parent pin id", default="0")
     align = IntProperty(name="Alignment to parent", default=0)
-    failed = BoolProperty(name="Execution failed", default=False)
     
 class VIEW3D_OT_pins_remove_operator(bpy.types.Operator):
     bl_idname = "view3d.pins_remove_operator"
@@ -554,26 +2330,69 @@ class VIEW3D_OT_pins_remove_operator(bpy.types.Operator):
     
     def execute(self, context):
         wm = context.window_manager
+        pin_id = wm.pins_data[self.id].id
         for pin in wm.pins_data:
-            if pin.parent == wm.pins_data[self.id].id:
+            if pin.parent == pin_id:
                 pin.parent = "0"
         wm.pins_data.remove(self.id)
-        save_pins(context)
+        touch_pins()
+        journal_pins(context, 'unpin', pin_id)
         return {'FINISHED'}
 
+PINS_LIST_PAGE = 50
+
 class PINS_UL_pins(bpy.types.UIList):
+    pages = 1
+    cache = (None, None)
+    
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
-        """if item.preset != active_preset_id(context):
-            return"""
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
-            if item.preset == active_preset_id(context):
-                layout.prop(item, "text", text="", emboss=False, icon_value=icon)
+            row = layout.row(align=True)
+            row.prop(item, "text", text="", emboss=False, icon_value=icon)
+            if item.type == 0:
+                row.operator(VIEW3D_OT_pins_toggle_menu.bl_idname, text="", icon='X', emboss=False).menu = item.call
             else:
-                layout.enabled = False
-                layout.label(item.text + 'XX!')
+                row.operator(VIEW3D_OT_pins_remove_operator.bl_idname, text="", icon='X', emboss=False).id = index
         elif self.layout_type in {'GRID'}:
             layout.alignment = 'CENTER'
             layout.label("", icon_value=icon)
+    
+    def filter_items(self, context, data, propname):
+        wm = context.window_manager
+        index = pins_index(context)
+        key = (index.key, self.filter_name, self.use_filter_sort_alpha, wm.pins_list_page)
+        if PINS_UL_pins.cache[0] == key:
+            return PINS_UL_pins.cache[1]
+        
+        pins = getattr(data, propname)
+        pattern = self.filter_name.lower()
+        if pattern and '*' not in pattern:
+            pattern = '*%s*' % pattern
+        texts = {}
+        shown = []
+        for i in index.active:
+            text = pins[i].text.lower()
+            texts[i] = text
+            if not pattern or fnmatchcase(text, pattern):
+                shown.append(i)
+        
+        order = []
+        if self.use_filter_sort_alpha:
+            shown.sort(key=texts.get)
+            order = [0] * len(pins)
+            hidden = set(shown)
+            for n, i in enumerate(shown + [i for i in range(len(pins)) if i not in hidden]):
+                order[i] = n
+        
+        pages = max(1, (len(shown) + PINS_LIST_PAGE - 1) // PINS_LIST_PAGE)
+        page = min(wm.pins_list_page, pages) - 1
+        flags = [0] * len(pins)
+        for i in shown[page * PINS_LIST_PAGE:(page + 1) * PINS_LIST_PAGE]:
+            flags[i] = self.bitflag_filter_item
+        
+        PINS_UL_pins.pages = pages
+        PINS_UL_pins.cache = (key, (flags, order))
+        return flags, order
         
 class VIEW3D_PT_pins_remove(bpy.types.Panel):
     bl_idname = "VIEW3D_PT_pins_remove"
@@ -590,29 +2409,22 @@ class VIEW3D_PT_pins_remove(bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
         wm = context.window_manager
-        col = layout.column()
-        sub = col.column(align=True)
         
-        #row = layout.row()
-        #row.template_list("PINS_UL_pins", "", wm, "pins_data", wm, "pins_data_active_index")
-
-        count = 0
-        for i, pin in enumerate(wm.pins_data):
-            if pin.preset == active_preset_id(context):
-                count += 1
-                if pin.type == 0:
-                    sub.operator(VIEW3D_OT_pins_toggle_menu.bl_idname, text=pin.text, icon='X').menu = pin.call
-                else:
-                    sub.operator(VIEW3D_OT_pins_remove_operator.bl_idname, text=pin.text, icon='X').id = i
-        if not count:
-            sub.label("This preset has no pins.")
+        if not len(pins_index(context).active):
+            layout.label("This preset has no pins.")
+            return
         
+        layout.template_list("PINS_UL_pins", "", wm, "pins_data", wm, "pins_data_active_index", rows=8)
+        if PINS_UL_pins.pages > 1:
+            row = layout.row(align=True)
+            row.prop(wm, "pins_list_page", text="Page")
+            row.label("of %i" % PINS_UL_pins.pages)
                     
 def menu_pin_id(context, menu):
-    for i, pin in enumerate(context.window_manager.pins_data):
-        if pin.preset == active_preset_id(context):
-            if pin.call == menu:
-                return i
+    wm = context.window_manager
+    for i in pins_index(context).active:
+        if wm.pins_data[i].call == menu:
+            return i
     return -1
     
 class VIEW3D_OT_pins_toggle_menu(bpy.types.Operator):
@@ -640,23 +2452,113 @@ class VIEW3D_OT_pins_toggle_menu(bpy.types.Operator):
             new_pin.call = self.menu
             new_pin.mode = context.mode
             new_pin.preset = active_preset_id(context)
+            journal_pins(context, 'pin', pin_record(new_pin))
         else:
+            pin_id = wm.pins_data[id].id
             for pin in wm.pins_data:
-                if pin.parent == wm.pins_data[id].id:
+                if pin.parent == pin_id:
                     pin.parent = "0"
             wm.pins_data.remove(id)
-        save_pins(context)
+            journal_pins(context, 'unpin', pin_id)
+        touch_pins()
         return {'FINISHED'}
         
+class VIEW3D_OT_pins_stats_export(bpy.types.Operator):
+    bl_idname = "view3d.pins_stats_export"
+    bl_label = "Export statistics"
+    bl_description = "Writes the collected pins statistics to a JSON file"
+    
+    filepath = StringProperty(subtype='FILE_PATH', default="")
+    
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = bpy.app.tempdir + "blender_pins_stats.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):
+        with open(bpy.path.abspath(self.filepath), "w") as f:
+            json.dump(_pins_stats.summary(), f, indent=1, sort_keys=True)
+        self.report({'INFO'}, "Pins statistics saved to %s" % self.filepath)
+        return {'FINISHED'}
+
+class VIEW3D_OT_pins_stats_reset(bpy.types.Operator):
+    bl_idname = "view3d.pins_stats_reset"
+    bl_label = "Reset statistics"
+    bl_description = "Clears the collected pins statistics"
+    
+    def execute(self, context):
+        _pins_stats.reset()
+        return {'FINISHED'}
+
+class VIEW3D_PT_pins_stats(bpy.types.Panel):
+    bl_idname = "VIEW3D_PT_pins_stats"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "TOOLS"
+    bl_category = "Pins"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    bl_label = "Statistics"
+    
+    def draw(self, context):
+        layout = self.layout
+        prefs = addon_preferences(context)
+        if prefs is not None:
+            layout.prop(prefs, 'stats_enabled')
+        
+        summary = _pins_stats.summary()
+        if not summary['timings']:
+            layout.label("No timings collected.")
+        else:
+            col = layout.column(align=True)
+            row = col.row()
+            for text in ("Function", "Calls", "p50", "p95", "Max"):
+                row.label(text)
+            for name in sorted(summary['timings']):
+                timing = summary['timings'][name]
+                row = col.row()
+                row.label(name)
+                row.label("%i" % timing['count'])
+                row.label("%.2f" % timing['p50'])
+                row.label("%.2f" % timing['p95'])
+                row.label("%.2f" % timing['max'])
+        
+        col = layout.column(align=True)
+        for name in sorted(summary['counters']):
+            col.label("%s: %i" % (name, summary['counters'][name]))
+        
+        row = layout.row(align=True)
+        row.operator(VIEW3D_OT_pins_stats_export.bl_idname, icon='EXPORT')
+        row.operator(VIEW3D_OT_pins_stats_reset.bl_idname, icon='X')
+
+class PinsPreferences(bpy.types.AddonPreferences):
+    bl_idname = __name__
+    
+    defer_menu_pins = BoolProperty(name="Defer menu pins", default=False, description="Add pin buttons to menus the first time the Pins panel is drawn instead of at startup")
+    stats_enabled = BoolProperty(name="Collect statistics", default=False, description="Time the pins drawing, event handling and saving code", update=pins_stats_update)
+    
+    def draw(self, context):
+        self.layout.prop(self, 'defer_menu_pins')
+        self.layout.prop(self, 'stats_enabled')
+
+def addon_preferences(context):
+    addon = context.user_preferences.addons.get(__name__)
+    if addon is None:
+        return None
+    return addon.preferences
+
 def create_properties():
     bpy.types.WindowManager.pins_presets = CollectionProperty("Pin presets", type=PinsPresetItem)
-    bpy.types.WindowManager.pins_presets_active_index = IntProperty("Pin active preset index", default=0)
+    bpy.types.WindowManager.pins_presets_active_index = IntProperty("Pin active preset index", default=0, update=pins_preset_update)
     bpy.types.WindowManager.pins_data = CollectionProperty("Pins", type=PinsItem)
     bpy.types.WindowManager.pins_data_active_index = IntProperty("Active pin index", default=0)
+    bpy.types.WindowManager.pins_list_page = IntProperty("Pins list page", default=1, min=1)
     bpy.types.WindowManager.pins_enabled = BoolProperty('Pins enabled', default=False)
     bpy.types.WindowManager.pins_invoke = BoolProperty('Pins invoke', default=False)
     bpy.types.WindowManager.pins_opacity = FloatProperty(name = 'Pins opacity', min = 0.1, max = 1.0, default = 0.65)
     bpy.types.WindowManager.pins_text = StringProperty('Pin text', default="", description="Name of your new pin. (Leave it blank for automatic naming)")
+    bpy.types.WindowManager.pins_macro_steps = IntProperty('Macro steps', default=2, min=2, max=32, description="Number of last used operators to pin as one macro")
+    bpy.types.WindowManager.pins_search = StringProperty('Pin search', default="", description="Search operators and menus to pin")
     bpy.types.WindowManager.pins_with_pars = BoolProperty('Pin with property', default=True, description="Disabled: Take new user input. Enabled: Use exact values from last use.")
     bpy.types.WindowManager.pins_loaded = BoolProperty('Pins loaded', default=False)
     
@@ -666,10 +2568,13 @@ def destroy_properties():
         'pins_presets_active_index',
         'pins_data',
         'pins_data_active_index',
+        'pins_list_page',
         'pins_enabled',
         'pins_invoke',
         'pins_opacity',
         'pins_text',
+        'pins_macro_steps',
+        'pins_search',
         'pins_with_pars',
         'pins_loaded'
     )
@@ -682,43 +2587,110 @@ def pin_layout(self, context):
     self.layout.separator()
     self.layout.operator(VIEW3D_OT_pins_toggle_menu.bl_idname, icon='UNPINNED').menu = self.bl_idname
         
+class MenuRegistry:
+    def __init__(self):
+        self.menus = None
+        self.injected = False
+    
+    def path(self):
+        return os.path.join(bpy.utils.user_resource('CONFIG', create=True), "blender_pins_menus.json")
+    
+    def key(self):
+        addons = sorted(bpy.context.user_preferences.addons.keys())
+        return "%s|%s" % (".".join(str(v) for v in bpy.app.version), ",".join(addons))
+    
+    def scan(self):
+        names = []
+        for type in dir(bpy.types):
+            if 'INFO_MT' in type or 'VIEW3D_MT' in type:
+                if hasattr(getattr(bpy.types, type), 'draw'):
+                    names.append(type)
+        return names
+    
+    def classes(self):
+        if self.menus is not None:
+            return self.menus
+        key = self.key()
+        try:
+            with open(self.path(), "r") as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            cache = {}
+        if cache.get('key') == key:
+            menus = [getattr(bpy.types, name, None) for name in cache.get('menus', ())]
+            if all(menus):
+                self.menus = menus
+                return menus
+        names = self.scan()
+        try:
+            with open(self.path(), "w") as f:
+                json.dump({'key': key, 'menus': names}, f)
+        except (IOError, OSError):
+            pass
+        self.menus = [getattr(bpy.types, name) for name in names]
+        return self.menus
+    
+    def inject(self):
+        if self.injected: return
+        for menu in self.classes():
+            menu.append(pin_layout)
+        self.injected = True
+    
+    def eject(self):
+        if not self.injected: return
+        for menu in self.classes():
+            menu.remove(pin_layout)
+        self.injected = False
+
+_menu_registry = MenuRegistry()
+
 def inject_menu_pins():
-    for type in dir(bpy.types):
-        if 'INFO_MT' in type or 'VIEW3D_MT' in type:
-            attr = getattr(bpy.types, type)
-            if hasattr(attr, 'draw'):
-                attr.append(pin_layout)
+    _menu_registry.inject()
 
 def eject_menu_pins():
-    for type in dir(bpy.types):
-        if 'INFO_MT' in type or 'VIEW3D_MT' in type:
-            attr = getattr(bpy.types, type)
-            if hasattr(attr, 'draw'):
-                attr.remove(pin_layout)
+    _menu_registry.eject()
 
 def view3d_draw_callback(self, context):
     if context.window_manager.pins_invoke:
         bpy.ops.view3d.pins('INVOKE_DEFAULT')
         context.window_manager.pins_invoke = False
+    _pins_journal.poll()
                 
 @persistent
 def pins_load_handler(nothing):
+    _pin_calls.clear()
+    _macro_queue.jobs.clear()
     if not bpy.context.window_manager.pins_loaded:
         load_pins(bpy.context)
+
+@persistent
+def pins_save_handler(nothing):
+    _pins_journal.flush(bpy.context)
        
 def register():
+    start = perf_counter()
     bpy.utils.register_module(__name__)
     create_properties()
-    inject_menu_pins()
+    prefs = addon_preferences(bpy.context)
+    if prefs is not None:
+        PinsStats.enabled = prefs.stats_enabled
+    if prefs is None or not prefs.defer_menu_pins:
+        inject_menu_pins()
     load_pins(bpy.context)
     bpy.app.handlers.load_post.append(pins_load_handler)
+    bpy.app.handlers.save_pre.append(pins_save_handler)
     print(type(bpy.types.SpaceView3D.draw_handler_add(view3d_draw_callback, (None, bpy.context), 'WINDOW', 'POST_PIXEL')))
+    if PinsStats.enabled:
+        _pins_stats.add('register', perf_counter() - start)
     
 def unregister():
     #Need to find a proper way to remove this later. Not really important, its removed after blender restarts anyway.
     #bpy.types.SpaceView3D.draw_handler_remove(_)
+    _pins_journal.flush(bpy.context)
+    _pins_saver.stop()
     VIEW3D_OT_pins.handle_remove(bpy.context)
     bpy.app.handlers.load_post.remove(pins_load_handler)
+    bpy.app.handlers.save_pre.remove(pins_save_handler)
     bpy.utils.unregister_module(__name__)
     eject_menu_pins()
     destroy_properties()
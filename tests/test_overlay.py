@@ -0,0 +1,99 @@
+"""Cache key and invalidation rules of the pins overlay."""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import run
+
+
+class CacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        session = run.Session(run.ADDON)
+        self.addCleanup(session.close)
+        self.PinsOverlay = session.module.PinsOverlay
+
+    def key(self, **changes):
+        args = dict(w=1280, h=720, generation=(1, 0, 4, 1), style=(0.1, 0.2, 0.3, 0.65),
+                    mode='OBJECT', dragged={3}, live={1, 2})
+        args.update(changes)
+        return self.PinsOverlay.cache_key(**args)
+
+    def test_key_is_order_independent(self):
+        self.assertEqual(self.key(live={2, 1}), self.key(live=[1, 2]))
+
+    def test_key_changes(self):
+        base = self.key()
+        for change in (dict(w=1000), dict(h=500), dict(generation=(2, 0, 4, 1)), dict(style=(0.1, 0.2, 0.3, 0.3)),
+                       dict(mode='EDIT_MESH'), dict(dragged=set()), dict(live={1})):
+            self.assertNotEqual(self.key(**change), base, change)
+
+    def test_validate(self):
+        overlay = self.PinsOverlay()
+        self.assertTrue(overlay.validate(self.key()))
+        self.assertFalse(overlay.validate(self.key()))
+        self.assertTrue(overlay.validate(self.key(w=1000)))
+        overlay.invalidate()
+        self.assertTrue(overlay.validate(self.key(w=1000)))
+
+
+class OverlayRenderTest(unittest.TestCase):
+    def setUp(self):
+        pins = run.make_pins(random.Random(5), 120, 1, chain=12)
+        pins[24]['set'] = False
+        self.hovered = pins[0]
+        self.hovered.update(x=0.5, y=0.5, parent="0")
+        self.session = run.Session(run.ADDON, pins, run.make_presets(1))
+        self.addCleanup(self.session.close)
+        self.overlay = self.session.module._pins_overlay
+        self.session.event('MOUSEMOVE', x=5, y=5)
+        self.session.frame()
+
+    def renders(self, step):
+        before = self.overlay.renders
+        step()
+        return self.overlay.renders - before
+
+    def frames(self, n=1):
+        for _ in range(n):
+            self.session.frame()
+
+    def test_idle_frames(self):
+        self.assertEqual(self.renders(lambda: self.frames(10)), 0)
+
+    def test_drag_frames(self):
+        def drag():
+            for k in range(10):
+                self.session.event('MOUSEMOVE', x=5 + k, y=5)
+                self.session.frame()
+        self.assertEqual(self.renders(drag), 0)
+
+    def test_resize(self):
+        def resize():
+            self.session.context.region.width = 1000
+            self.frames(3)
+        self.assertEqual(self.renders(resize), 1)
+
+    def test_hover_change(self):
+        def hover():
+            self.session.event('MOUSEMOVE', x=640, y=360)
+            self.frames(3)
+        self.assertEqual(self.renders(hover), 1)
+
+    def test_mode_change(self):
+        def mode():
+            self.session.context.mode = 'EDIT_MESH'
+            self.frames(3)
+        self.assertEqual(self.renders(mode), 1)
+
+    def test_opacity_change(self):
+        def opacity():
+            self.session.wm.pins_opacity = 0.3
+            self.frames(3)
+        self.assertEqual(self.renders(opacity), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Preset duplication must replay from the journal to the live state."""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import run
+
+
+class DuplicateReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.session = run.Session(run.ADDON, run.make_pins(random.Random(1), 12, 2), run.make_presets(2))
+        self.addCleanup(self.session.close)
+        self.module = self.session.module
+
+    def state(self):
+        snap = self.module._pins_store.snapshot(self.session.wm)
+        return sorted(zip(snap.id, snap.preset, snap.text, snap.parent))
+
+    def reload(self):
+        wm = self.session.wm
+        self.module._pins_saver.write() #wait for a compaction snapshot in flight
+        wm.pins_data.clear()
+        wm.pins_presets.clear()
+        with run.quiet():
+            self.module.load_pins(self.session.context)
+        return self.state()
+
+    def test_compaction_during_duplicate(self):
+        limit = self.module.PinsJournal.limit
+        self.addCleanup(setattr, self.module.PinsJournal, 'limit', limit)
+        self.module.PinsJournal.limit = 1
+        with run.quiet():
+            self.session.bpy.ops.view3d.pins_preset_duplicate()
+        live = self.state()
+        self.assertEqual(len(live), 18)
+        self.assertEqual(self.reload(), live)
+
+    def test_duplicate_after_merge(self):
+        wm = self.session.wm
+        with run.quiet():
+            wm.pins_presets_active_index = 0
+            self.session.bpy.ops.view3d.pins_preset_merge(target=wm.pins_presets[1].id)
+            self.session.bpy.ops.view3d.pins_preset_duplicate()
+        live = self.state()
+        self.assertEqual(len(live), 24)
+        self.assertEqual(self.reload(), live)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Redraw requests made by the pins modal operator under synthetic event streams."""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import run
+
+
+def make_pin(id, **fields):
+    pin = run.make_pins(random.Random(0), 1, 1)[0]
+    pin.update(id=id, x=0.5, y=0.5)
+    pin.update(fields)
+    return pin
+
+
+class RedrawTest(unittest.TestCase):
+    def open(self, pins):
+        self.session = run.Session(run.ADDON, pins, run.make_presets(1))
+        self.addCleanup(self.session.close)
+        self.session.frame()
+        self.clock = [1000.0]
+        self.session.module.perf_counter = lambda: self.clock[0]
+        return self.session
+
+    def requests(self, events):
+        """Feed events, drawing a frame after each one that asked for a redraw."""
+        area = self.session.context.area
+        start = area.redraws
+        for event in events:
+            before = area.redraws
+            self.session.event(*event)
+            if area.redraws != before:
+                self.session.frame()
+        return area.redraws - start
+
+    def test_idle_mousemove(self):
+        self.open([make_pin('a')])
+        self.assertEqual(self.requests([('MOUSEMOVE', 'NOTHING', 100 + i % 50, 100) for i in range(1000)]), 1)
+        self.assertEqual(self.requests([('TIMER',)] * 100), 0)
+
+    def test_crossing_pin(self):
+        self.open([make_pin('a')])
+        self.requests([('MOUSEMOVE', 'NOTHING', 500, 360)])
+        self.assertEqual(self.requests([('MOUSEMOVE', 'NOTHING', 500 + i, 360) for i in range(300)]), 2)
+
+    def test_dragging(self):
+        self.open([make_pin('a', set=False)])
+        self.requests([('MOUSEMOVE', 'NOTHING', 100, 100)])
+        self.assertEqual(self.requests([('MOUSEMOVE', 'NOTHING', 101 + i, 100) for i in range(100)]), 100)
+
+    def test_failed_flash(self):
+        session = self.open([make_pin('a', type=1, call='bpy.ops.mesh.primitive_cube_add()')])
+        session.bpy.ops.failing.add('mesh.primitive_cube_add')
+        self.requests([('MOUSEMOVE', 'NOTHING', 640, 360)])
+        self.assertEqual(self.requests([('LEFTMOUSE', 'RELEASE', 640, 360)]), 1)
+        self.assertIn('a', session.module._pins_layout.flashing)
+        self.assertEqual(self.requests([('TIMER',)] * 2), 2)
+        self.clock[0] += session.module.FAILED_FLASH
+        self.assertEqual(self.requests([('TIMER',)]), 1)
+        self.assertNotIn('a', session.module._pins_layout.flashing)
+        self.assertEqual(self.requests([('TIMER',)] * 10), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
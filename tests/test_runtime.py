@@ -0,0 +1,65 @@
+"""Drawing keeps transient pin state out of RNA until a pin is committed."""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import run
+import stubs
+
+
+def rna_writes():
+    return stubs.rna_log.count('set')
+
+
+class RuntimeStateTest(unittest.TestCase):
+    def setUp(self):
+        pins = run.make_pins(random.Random(2), 40, 1, chain=10)
+        for pin in pins[:10]:
+            pin.update(x=0.5, y=0.5, align=3)
+        pins[0]['set'] = False
+        self.session = run.Session(run.ADDON, pins, run.make_presets(1))
+        self.addCleanup(self.session.close)
+        self.layout = self.session.module._pins_layout
+
+    def test_steady_frame(self):
+        self.session.event('MOUSEMOVE', x=640, y=100)
+        self.session.frame()
+        stubs.rna_log.clear()
+        for _ in range(5):
+            self.session.frame()
+        self.assertEqual(rna_writes(), 0)
+
+    def test_drag_frames(self):
+        self.session.frame()
+        stubs.rna_log.clear()
+        for k in range(20):
+            self.session.event('MOUSEMOVE', x=40 + k, y=40)
+            self.session.frame()
+        self.assertEqual(rna_writes(), 0)
+        self.assertNotEqual(self.session.wm.pins_data[0].x, float(self.layout.x[0]))
+
+    def test_commit_writes_back(self):
+        wm = self.session.wm
+        self.session.event('MOUSEMOVE', x=40, y=40)
+        self.session.frame()
+        self.session.event('MOUSEMOVE', x=40, y=40)
+        self.assertEqual(self.session.op.hover, 0)
+        child = self.layout.children[0][0]
+        stubs.rna_log.clear()
+        self.session.event('RIGHTMOUSE', 'PRESS', 40, 40)
+        self.assertGreater(rna_writes(), 0)
+        self.assertTrue(wm.pins_data[0].set)
+        self.assertEqual((round(wm.pins_data[0].x * 1280), round(wm.pins_data[0].y * 720)), (40, 40))
+        self.assertEqual(wm.pins_data[0].parent, "0")
+        self.session.frame()
+        self.assertAlmostEqual(wm.pins_data[child].x, (40 + 123) / 1280.0, places=5)
+        stubs.rna_log.clear()
+        self.session.frame()
+        self.assertEqual(rna_writes(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""SnapGrid must pick the same parent and alignment as the original linear scan."""
+
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import run
+
+WIDTH = 1280
+HEIGHT = 720
+
+
+def float32(value):
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+def linear_find_parent(pins, childid, x, y, w, h):
+    """find_parent as it was before SnapGrid: a scan over every pin."""
+    align = 0
+    parent = "0"
+    for pin in pins:
+        if pin['id'] == childid or pin['parent'] == childid: continue
+        bx = pin['x'] * w
+        by = pin['y'] * h
+        if by + 11 >= y >= by - 11:
+            if bx - 110 <= x <= bx - 60:
+                align = 2
+                parent = pin['id']
+            elif bx + 60 <= x <= bx + 110:
+                align = 3
+                parent = pin['id']
+        elif bx - 59 <= x <= bx + 59:
+            if by + 11 <= y <= by + 30:
+                align = 1
+                parent = pin['id']
+            elif by - 11 >= y >= by - 30:
+                align = 0
+                parent = pin['id']
+    return [parent, align]
+
+
+class SnapGridTest(unittest.TestCase):
+    def make_pins(self, rng, count):
+        pins = run.make_pins(rng, count, 1)
+        for pin in pins:
+            pin['x'] = float32(rng.randint(0, WIDTH) / float(WIDTH))
+            pin['y'] = float32(rng.randint(0, HEIGHT) / float(HEIGHT))
+        for pin in pins[:count // 10]:
+            pin['parent'] = 'child'
+        pins.append(dict(pins[0], id='child', parent="0", set=False))
+        return pins
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(1)
+        for trial in range(5):
+            pins = self.make_pins(rng, 300)
+            session = run.Session(run.ADDON, pins, run.make_presets(1))
+            try:
+                for _ in range(2000):
+                    x = rng.randint(-50, WIDTH + 50)
+                    y = rng.randint(-50, HEIGHT + 50)
+                    self.assertEqual(
+                        session.module.find_parent('child', x, y, WIDTH, HEIGHT, session.context),
+                        linear_find_parent(pins, 'child', x, y, WIDTH, HEIGHT),
+                        (trial, x, y))
+            finally:
+                session.close()
+
+    def test_rebuilds_on_resize(self):
+        pins = self.make_pins(random.Random(2), 50)
+        session = run.Session(run.ADDON, pins, run.make_presets(1))
+        try:
+            target = pins[20]
+            x = int(round(target['x'] * 640)) + 80
+            y = int(round(target['y'] * 360))
+            session.module.find_parent('child', x, y, WIDTH, HEIGHT, session.context)
+            self.assertEqual(
+                session.module.find_parent('child', x, y, 640, 360, session.context),
+                linear_find_parent(pins, 'child', x, y, 640, 360))
+        finally:
+            session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()